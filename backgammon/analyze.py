@@ -0,0 +1,142 @@
+"""
+Bulk position analysis.
+
+    python -m backgammon.analyze [INPUT] [--output PATH] [--binary]
+                                 [--bot NAME] [--weights PATH] [--depth D]
+                                 [--workers N] [--chunk-size N]
+
+streams positions from INPUT (standard input by default) through a bot and
+writes one JSON line per position to --output (standard output by default)
+in input order, each chunk as soon as it and those before it are done. A
+text input line is a base64 engine ID (BackgammonEngine.position_id()), or
+a board ID followed by the side to move and the dice:
+
+    4HPwATDgc/ABMA black 31
+
+With --binary the input is a stream of 12-byte engine IDs instead. Output
+lines are the evaluation server's replies (see serve.py) with the record's
+number, from 0, as "id"; a bad record gets an "error" line and the run goes
+on. Chunks of --chunk-size positions go to --workers processes with at most
+two chunks per worker in flight, so memory stays bounded however long the
+input is.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from backgammon.engine import ENGINE_ID_SIZE
+from backgammon.serve import BOTS, encode_id, evaluate_engines, make_bot, parse_request
+
+# The bot and evaluator of a worker process, made once by _start_worker
+_worker = None
+
+
+# The server request for one text input line
+def parse_line(line: str) -> dict:
+    fields = line.split()
+    if len(fields) == 1:
+        return {"position": fields[0]}
+    if len(fields) == 3 and len(fields[2]) == 2 and fields[2].isdigit():
+        return {"position": fields[0], "turn": fields[1], "dice": [int(fields[2][0]), int(fields[2][1])]}
+    raise ValueError("Line must be an engine ID, or a board ID, the side to move and the dice")
+
+# The 12-byte engine IDs of a binary input file. A short last record is passed on to be reported
+def read_binary(file):
+    while record := file.read(ENGINE_ID_SIZE):
+        yield record
+
+# Replies for records, text lines or engine IDs numbered from first, with bot's plays
+# and evaluator's scores. A record that can't be read or loaded, whatever the reason, gets
+# an error reply and the others are still analyzed
+def analyze_records(bot, evaluator, first, records) -> list:
+    replies = [None] * len(records)
+    indices = []
+    engines = []
+    for index, record in enumerate(records):
+        try:
+            request = {"position": encode_id(record)} if isinstance(record, bytes) else parse_line(record)
+            engines.append(parse_request(request))
+            indices.append(index)
+        except Exception as error:
+            replies[index] = {"id": first + index, "error": str(error)}
+
+    for index, reply in zip(indices, evaluate_engines(bot, evaluator, engines)):
+        replies[index] = {"id": first + index, **reply}
+    return replies
+
+# (number of the first record, records) for each chunk of chunk_size records, read as needed
+def _chunks(records, chunk_size):
+    records = iter(records)
+    first = 0
+    while chunk := list(itertools.islice(records, chunk_size)):
+        yield first, chunk
+        first += len(chunk)
+
+def _start_worker(bot_name, weights, depth):
+    global _worker
+    _worker = make_bot(bot_name, weights=weights, depth=depth)
+
+def _analyze_chunk(first, records) -> list:
+    bot, evaluator = _worker
+    return analyze_records(bot, evaluator, first, records)
+
+# Replies for every record of the iterable records, as one list per chunk of chunk_size records, in order.
+# Records are only read as chunks are handed out, at most 2 * workers of them at a time
+def analyze(records, bot_name="gpt", weights=None, depth=2, workers=1, chunk_size=256):
+    chunks = _chunks(records, chunk_size)
+    if workers <= 1:
+        bot, evaluator = make_bot(bot_name, weights=weights, depth=depth)
+        for first, chunk in chunks:
+            yield analyze_records(bot, evaluator, first, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                             initargs=(bot_name, weights, depth)) as executor:
+        # A bounded window of chunks in flight, taken in order
+        window = deque()
+        for first, chunk in chunks:
+            window.append(executor.submit(_analyze_chunk, first, chunk))
+            if len(window) >= 2 * workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a stream of positions with a bot.")
+    parser.add_argument("input", nargs="?", default="-", help="positions to read (default: standard input)")
+    parser.add_argument("--output", default="-", help="file to write (default: standard output)")
+    parser.add_argument("--binary", action="store_true", help="input is 12-byte engine IDs instead of text lines")
+    parser.add_argument("--bot", choices=BOTS, default="gpt", help="bot choosing the plays (default: gpt)")
+    parser.add_argument("--weights", help="network weights (.npz) for the network bot or expectiminimax evaluator")
+    parser.add_argument("--depth", type=int, default=2, help="expectiminimax search depth (default: 2)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (default: 1)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="positions per worker task (default: 256)")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        source = sys.stdin.buffer if args.binary else sys.stdin
+    else:
+        source = open(args.input, "rb" if args.binary else "r")
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+
+    start_time = time.perf_counter()
+    count = errors = 0
+    with source, output:
+        records = read_binary(source) if args.binary else source
+        for replies in analyze(records, args.bot, args.weights, args.depth, args.workers, args.chunk_size):
+            output.writelines(json.dumps(reply) + "\n" for reply in replies)
+            output.flush()
+            count += len(replies)
+            errors += sum("error" in reply for reply in replies)
+    print(f"Analyzed {count} positions ({errors} errors) in {time.perf_counter() - start_time:.1f} s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,477 @@
+import cProfile
+import json
+import os
+import pstats
+import random
 import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from backgammon.bots import BackgammonBot
 from backgammon.engine import BackgammonEngine, Player
 
 
+# Instrumentation of one game. Times are in seconds; make_move_time includes the legal move
+# generation it triggers, which movegen_time also counts
+class GameStats:
+    def __init__(self, bot1_is_white=True):
+        self.bot1_is_white = bot1_is_white
+        # White's result (BackgammonEngine.game_value), 0 for a game stopped early
+        self.value = 0
+        self.plies = 0
+        self.moves = 0
+        self.hits = 0
+        self.skipped_turns = 0
+        self.bot1_time = 0.0
+        self.bot2_time = 0.0
+        self.make_move_time = 0.0
+        self.movegen_time = 0.0
+
+# Instrumentation totals over many games
+class ArbiterStats:
+    def __init__(self):
+        self.games = 0
+        self.plies = 0
+        self.moves = 0
+        self.hits = 0
+        self.skipped_turns = 0
+        self.bot1_time = 0.0
+        self.bot2_time = 0.0
+        self.make_move_time = 0.0
+        self.movegen_time = 0.0
+        self.bot1_gammons = 0
+        self.bot1_backgammons = 0
+        self.bot2_gammons = 0
+        self.bot2_backgammons = 0
+
+    def add(self, game: GameStats):
+        self.games += 1
+        for name in ("plies", "moves", "hits", "skipped_turns", "bot1_time", "bot2_time", "make_move_time",
+                     "movegen_time"):
+            setattr(self, name, getattr(self, name) + getattr(game, name))
+
+        # The game value is White's, so it is bot1's when bot1 played white
+        value = game.value if game.bot1_is_white else -game.value
+        if value >= 2:
+            self.bot1_gammons += 1
+        if value == 3:
+            self.bot1_backgammons += 1
+        if value <= -2:
+            self.bot2_gammons += 1
+        if value == -3:
+            self.bot2_backgammons += 1
+
+    def merge(self, other: "ArbiterStats"):
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    # Totals plus per-game averages, as plain values ready for printing or JSON
+    def summary(self) -> dict:
+        summary = dict(vars(self))
+        games = max(self.games, 1)
+        for name in ("plies", "moves", "hits", "skipped_turns"):
+            summary[f"{name}_per_game"] = getattr(self, name) / games
+        for name in ("bot1_time", "bot2_time", "make_move_time", "movegen_time"):
+            summary[f"{name}_ms_per_game"] = getattr(self, name) * 1000.0 / games
+        return summary
+
+# Outcome of one finished game: the deal it was played on, who had white, the winning bot (1 or 2),
+# White's game value (BackgammonEngine.game_value) and its GameStats when instrumented
+class GameResult:
+    def __init__(self, game, bot1_is_white, winner, value, stats:GameStats=None):
+        self.game = game
+        self.bot1_is_white = bot1_is_white
+        self.winner = winner
+        self.value = value
+        self.stats = stats
+
 class ArbiterResults:
     def __init__(self):
         self.bot1_wins = 0
         self.bot2_wins = 0
         self.simulation_time_ms = 0
 
+        # Filled in by instrumented runs only: the totals and the GameStats of every game
+        self.stats = None
+        self.games = []
+
+    # Adds the game counts of another set of results to this one
+    def merge(self, other: "ArbiterResults"):
+        self.bot1_wins += other.bot1_wins
+        self.bot2_wins += other.bot2_wins
+        if other.stats is not None:
+            if self.stats is None:
+                self.stats = ArbiterStats()
+            self.stats.merge(other.stats)
+            self.games.extend(other.games)
+
+    # Counts one finished game
+    def add_result(self, result: GameResult):
+        if result.winner == 1:
+            self.bot1_wins += 1
+        else:
+            self.bot2_wins += 1
+        if result.stats is not None:
+            self.add_game(result.stats)
+
+    # Records the stats of one finished instrumented game
+    def add_game(self, game: GameStats):
+        if self.stats is None:
+            self.stats = ArbiterStats()
+        self.stats.add(game)
+        self.games.append(game)
+
+# Engine that also times its legal move generation, used for instrumented games
+class InstrumentedEngine(BackgammonEngine):
+    movegen_time = 0.0
+
+    def generate_legal_moves(self):
+        start_time = time.perf_counter()
+        super().generate_legal_moves()
+        self.movegen_time += time.perf_counter() - start_time
+
 class BackgammonArbiter:
     def __init__(self, bot1: BackgammonBot, bot2: BackgammonBot):
         self.bot1 = bot1
         self.bot2 = bot2
 
-    def simulate(self, iterations, print_board=False, print_progress=False, delay=0.0):
+    # Plays iterations games of bot1 (white) against bot2 (black).
+    # With a seed every game gets its own seed derived from it and the game number, so the
+    # results are the same whatever the number of workers. workers > 1 spreads the games over
+    # a process pool in chunks of chunk_size games, each worker using its own copy of the bots.
+    # duplicate=True plays every game twice on the same dice stream, the second time with the
+    # colours swapped, so iterations deals give 2 * iterations games.
+    # instrument=True fills results.stats and results.games (see GameStats). profile names a file
+    # to write cProfile statistics of the games to, merged over all workers
+    def simulate(self, iterations, print_board=False, print_progress=False, delay=0.0,
+                 workers=1, seed=None, chunk_size=None, duplicate=False, instrument=False, profile=None):
         results = ArbiterResults()
         start_time = time.perf_counter()
 
-        while iterations > 0:
-            iterations -= 1
-            self.simulate_single_game(white_bot=self.bot1, black_bot=self.bot2, results=results)
+        # Forked workers share the parent's random state and duplicate games need a dice
+        # stream to replay, so both always run seeded
+        if seed is None and (workers > 1 or duplicate):
+            seed = random.SystemRandom().getrandbits(64)
+
+        if workers <= 1:
+            profiler = None if profile is None else cProfile.Profile()
+            if profiler is not None:
+                profiler.enable()
+            self.simulate_games(first_game=0, count=iterations, seed=seed, results=results, duplicate=duplicate,
+                                instrument=instrument)
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(profile)
+        else:
+            if chunk_size is None:
+                chunk_size = max(1, iterations // (workers * 4))
+
+            firsts = list(range(0, iterations, chunk_size))
+            counts = [min(chunk_size, iterations - first) for first in firsts]
+            profiles = [None if profile is None else f"{profile}.{first}" for first in firsts]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for chunk in executor.map(_simulate_chunk, [self.bot1] * len(firsts), [self.bot2] * len(firsts),
+                                          firsts, counts, [seed] * len(firsts), [duplicate] * len(firsts),
+                                          [instrument] * len(firsts), profiles):
+                    results.merge(chunk)
+
+            # One profile per chunk, combined into the requested file
+            if profile is not None:
+                pstats.Stats(*profiles).dump_stats(profile)
+                for path in profiles:
+                    os.remove(path)
 
         results.simulation_time_ms = (time.perf_counter() - start_time) * 1000.0
         return results
-    
-    def simulate_single_game(self, white_bot:BackgammonBot, black_bot:BackgammonBot, results:ArbiterResults):
-        engine = BackgammonEngine()
-        engine.start()
+
+    # Plays iterations deals like simulate, but as a GameStream that yields each game's GameResult
+    # in order as it finishes and keeps running totals in its results. With a checkpoint path the
+    # progress is saved there every checkpoint_every deals and when the stream stops, and a stream
+    # given an existing checkpoint resumes after the deals it records
+    def iter_games(self, iterations, workers=1, seed=None, chunk_size=None, duplicate=False, instrument=False,
+                   checkpoint=None, checkpoint_every=100) -> "GameStream":
+        return GameStream(self, iterations, workers=workers, seed=seed, chunk_size=chunk_size, duplicate=duplicate,
+                          instrument=instrument, checkpoint=checkpoint, checkpoint_every=checkpoint_every)
+
+    # Plays count games numbered from first_game. When seed is given each game rolls its dice from
+    # its own seeded stream and the bots' random choices are seeded too. With duplicate the same
+    # dice stream is replayed with bot2 playing white. instrument records each game's GameStats
+    def simulate_games(self, first_game, count, seed, results: ArbiterResults, duplicate=False, instrument=False):
+        for result in self.iter_results(first_game, count, seed, duplicate=duplicate, instrument=instrument):
+            results.add_result(result)
+        return results
+
+    # The GameResult of each game simulate_games would play, as it finishes
+    def iter_results(self, first_game, count, seed, duplicate=False, instrument=False):
+        engine_class = InstrumentedEngine if instrument else BackgammonEngine
+        for game in range(first_game, first_game + count):
+            for bot1_is_white in ((True, False) if duplicate else (True,)):
+                stats = GameStats(bot1_is_white) if instrument else None
+                results = ArbiterResults()
+                white_bot, black_bot = (self.bot1, self.bot2) if bot1_is_white else (self.bot2, self.bot1)
+
+                # A seeded game reseeds the global random module for the bots, so the caller's random
+                # state is put back before the result is handed out. Unseeded games draw from the caller's
+                # stream as it runs on, or every one of them would replay the same game
+                state = None if seed is None else random.getstate()
+                try:
+                    engine = engine_class() if seed is None else seeded_engine(seed, game, engine_class)
+                    self.simulate_single_game(white_bot=white_bot, black_bot=black_bot, results=results,
+                                              engine=engine, bot1_is_white=bot1_is_white, stats=stats)
+                finally:
+                    if state is not None:
+                        random.setstate(state)
+                yield GameResult(game, bot1_is_white, 1 if results.bot1_wins else 2, engine.game_value(), stats)
+
+    # Plays one game on engine (a fresh engine if None) and credits the winner's bot in results.
+    # With new_game=False the game continues from the engine's current state, and max_plies stops
+    # it without a winner after that many turns. observer, if given, is called with the engine and
+    # each chosen move before it is made. stats, if given, is filled in with the game's GameStats;
+    # legal move generation is only timed on an InstrumentedEngine. Returns the engine in its final state
+    def simulate_single_game(self, white_bot:BackgammonBot, black_bot:BackgammonBot, results:ArbiterResults,
+                             engine:BackgammonEngine=None, bot1_is_white=True, new_game=True, max_plies=None,
+                             observer=None, stats:GameStats=None):
+        if engine is None:
+            engine = BackgammonEngine() if stats is None else InstrumentedEngine()
+        if new_game:
+            engine.start()
+        if stats is not None:
+            return self._simulate_instrumented(white_bot, black_bot, results, engine, bot1_is_white, new_game,
+                                               max_plies, observer, stats)
         hits = 0
         moves = 0
+        plies = 0
 
         while engine.winner is None:
-            bot = white_bot if engine.turn is Player.WHITE else black_bot
+            if max_plies is not None and plies >= max_plies:
+                return engine
+
+            turn = engine.turn
+            bot = white_bot if turn is Player.WHITE else black_bot
             move = bot.calculate_move(engine=engine)
+            if observer is not None:
+                observer(engine, move)
             engine.make_move(move)
 
             moves += 1
             if move.hit == True:
                 hits += 1
+            if engine.turn is not turn:
+                plies += 1
+
+        self._credit_winner(engine, results, bot1_is_white)
+        return engine
+
+    # The game loop of simulate_single_game with every phase timed, kept apart so uninstrumented
+    # games pay nothing for it
+    def _simulate_instrumented(self, white_bot, black_bot, results, engine, bot1_is_white, new_game, max_plies,
+                               observer, stats):
+        perf_counter = time.perf_counter
+        # Rolls before this game's first; a continued game's current roll is still to be played
+        first_roll = 0 if new_game else engine.rolls - 1
+        last_roll = None
+        movegen_start = getattr(engine, "movegen_time", 0.0)
+        plies = 0
+
+        while engine.winner is None:
+            if max_plies is not None and plies >= max_plies:
+                break
+
+            # Every roll that reaches a bot is a turn played; the others were skipped
+            if engine.rolls != last_roll:
+                last_roll = engine.rolls
+                stats.plies += 1
+
+            turn = engine.turn
+            bot = white_bot if turn is Player.WHITE else black_bot
+            start_time = perf_counter()
+            move = bot.calculate_move(engine=engine)
+            decided_time = perf_counter()
+            if observer is not None:
+                observer(engine, move)
+                decided_time = perf_counter()
+            engine.make_move(move)
+            stats.make_move_time += perf_counter() - decided_time
+
+            if (turn is Player.WHITE) == bot1_is_white:
+                stats.bot1_time += decided_time - start_time
+            else:
+                stats.bot2_time += decided_time - start_time
+            stats.moves += 1
+            if move.hit:
+                stats.hits += 1
+            if engine.turn is not turn:
+                plies += 1
 
-        if engine.winner == Player.WHITE:
+        pending = 1 if engine.winner is None else 0
+        stats.skipped_turns = engine.rolls - first_roll - stats.plies - pending
+        stats.movegen_time = getattr(engine, "movegen_time", 0.0) - movegen_start
+        stats.value = engine.game_value()
+        if engine.winner is not None:
+            self._credit_winner(engine, results, bot1_is_white)
+        return engine
+
+    # Counts the finished game as a win for the bot that played the winning colour
+    def _credit_winner(self, engine:BackgammonEngine, results:ArbiterResults, bot1_is_white):
+        if engine.winner not in (Player.WHITE, Player.BLACK):
+            raise ValueError("Unknown Winner Value")
+        if (engine.winner == Player.WHITE) == bot1_is_white:
             results.bot1_wins += 1
-        elif engine.winner == Player.BLACK:
-            results.bot2_wins += 1
         else:
-            raise ValueError("Unknown Winner Value")
+            results.bot2_wins += 1
+
+class GameStream:
+    """
+    Games of a BackgammonArbiter.iter_games run. Iterating yields each
+    game's GameResult in deal order; `results` holds the running totals and
+    `completed` the number of deals finished, a duplicate deal finishing
+    after both of its games.
+
+    The run is always seeded (a seed is drawn when none is given), so the
+    seed and the number of completed deals pin down every game still to
+    play. A checkpoint saves them as JSON along with the totals so far; the
+    per-game list results.games only covers games played since the last
+    resume.
+    """
+
+    def __init__(self, arbiter: BackgammonArbiter, iterations, workers=1, seed=None, chunk_size=None,
+                 duplicate=False, instrument=False, checkpoint=None, checkpoint_every=100):
+        self.arbiter = arbiter
+        self.iterations = iterations
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.duplicate = duplicate
+        self.instrument = instrument
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+
+        self.seed = random.SystemRandom().getrandbits(64) if seed is None else seed
+        self.completed = 0
+        self.results = ArbiterResults()
+        if checkpoint is not None and os.path.exists(checkpoint):
+            self._resume()
+
+    def __iter__(self):
+        start_time = time.perf_counter()
+        elapsed_ms = self.results.simulation_time_ms
+        saved = self.completed
+        try:
+            for deal_results in self._deals():
+                yield from deal_results
+                # A deal counts once all its games are through; one interrupted midway is played again on resume
+                for result in deal_results:
+                    self.results.add_result(result)
+                self.completed += 1
+                self.results.simulation_time_ms = elapsed_ms + (time.perf_counter() - start_time) * 1000.0
+
+                if self.checkpoint is not None and self.completed - saved >= self.checkpoint_every:
+                    self.save()
+                    saved = self.completed
+        finally:
+            # Whatever stopped the stream, keep the deals that did finish
+            if self.checkpoint is not None and self.completed != saved:
+                self.save()
+
+    # Writes the checkpoint, replacing the old one in a single step so it is never left half written
+    def save(self):
+        stats = None if self.results.stats is None else vars(self.results.stats)
+        state = {
+            "version": 1,
+            "bots": [self.arbiter.bot1.name, self.arbiter.bot2.name],
+            "iterations": self.iterations,
+            "duplicate": self.duplicate,
+            "instrument": self.instrument,
+            "seed": self.seed,
+            "completed": self.completed,
+            "bot1_wins": self.results.bot1_wins,
+            "bot2_wins": self.results.bot2_wins,
+            "simulation_time_ms": self.results.simulation_time_ms,
+            "stats": stats,
+        }
+        temporary = f"{self.checkpoint}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(state, file, indent=2)
+        os.replace(temporary, self.checkpoint)
+
+    def _resume(self):
+        with open(self.checkpoint) as file:
+            state = json.load(file)
+
+        expected = {"bots": [self.arbiter.bot1.name, self.arbiter.bot2.name], "iterations": self.iterations,
+                    "duplicate": self.duplicate, "instrument": self.instrument}
+        for key, value in expected.items():
+            if state.get(key) != value:
+                raise ValueError(f"Checkpoint {self.checkpoint} is for a different run ({key}: {state.get(key)!r})")
+
+        self.seed = state["seed"]
+        self.completed = state["completed"]
+        self.results.bot1_wins = state["bot1_wins"]
+        self.results.bot2_wins = state["bot2_wins"]
+        self.results.simulation_time_ms = state["simulation_time_ms"]
+        if state["stats"] is not None:
+            self.results.stats = ArbiterStats()
+            vars(self.results.stats).update(state["stats"])
+
+    # The results of each remaining deal, in order: one GameResult, or two for duplicate deals
+    def _deals(self):
+        per_deal = 2 if self.duplicate else 1
+        first, count = self.completed, self.iterations - self.completed
+        if self.workers <= 1:
+            deal = []
+            for result in self.arbiter.iter_results(first, count, self.seed, self.duplicate, self.instrument):
+                deal.append(result)
+                if len(deal) == per_deal:
+                    yield deal
+                    deal = []
+            return
+
+        chunk_size = self.chunk_size or max(1, min(100, count // (self.workers * 4)))
+        chunks = iter(range(first, first + count, chunk_size))
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            # A bounded window of chunks in flight, taken in order
+            window = deque()
+            for chunk_first in chunks:
+                window.append(self._submit(executor, chunk_first, min(chunk_size, first + count - chunk_first)))
+                if len(window) >= 2 * self.workers:
+                    break
+
+            while window:
+                results = window.popleft().result()
+                chunk_first = next(chunks, None)
+                if chunk_first is not None:
+                    window.append(self._submit(executor, chunk_first, min(chunk_size, first + count - chunk_first)))
+                for index in range(0, len(results), per_deal):
+                    yield results[index:index + per_deal]
+
+    def _submit(self, executor, first_game, count):
+        return executor.submit(_play_chunk, self.arbiter.bot1, self.arbiter.bot2, first_game, count, self.seed,
+                               self.duplicate, self.instrument)
+
+# Seed for one random stream ("dice" or "bots") of one game of a seeded run
+def game_seed(seed, game, stream) -> str:
+    return f"{seed}:{game}:{stream}"
+
+# Seeds the bots' random choices for game of a seeded run and returns an engine rolling that game's dice.
+# The bots draw from the global random module, so callers that play the game in the caller's process
+# save random.getstate() first and restore it after the game, as iter_results does
+def seeded_engine(seed, game, engine_class=BackgammonEngine) -> BackgammonEngine:
+    random.seed(game_seed(seed, game, "bots"))
+    return engine_class(rng=random.Random(game_seed(seed, game, "dice")))
+
+# Process pool entry point. Runs in the worker with the worker's own unpickled bots
+def _simulate_chunk(bot1, bot2, first_game, count, seed, duplicate, instrument=False, profile=None) -> ArbiterResults:
+    arbiter = BackgammonArbiter(bot1=bot1, bot2=bot2)
+    profiler = None if profile is None else cProfile.Profile()
+    if profiler is not None:
+        profiler.enable()
+    results = arbiter.simulate_games(first_game=first_game, count=count, seed=seed, results=ArbiterResults(),
+                                     duplicate=duplicate, instrument=instrument)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+    return results
+
+# Process pool entry point for streams: the GameResult of every game of the chunk, in order
+def _play_chunk(bot1, bot2, first_game, count, seed, duplicate, instrument) -> list:
+    arbiter = BackgammonArbiter(bot1=bot1, bot2=bot2)
+    return list(arbiter.iter_results(first_game, count, seed, duplicate=duplicate, instrument=instrument))
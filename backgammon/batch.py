@@ -0,0 +1,297 @@
+"""
+Lockstep batched game simulation in NumPy.
+
+BatchEngine holds N games as an (N, 28) int8 array of board cells laid out
+like Board.cells, with the side to move and the dice left as arrays. Every
+step works out the legal moves of all N games at once, lets a policy pick
+one per game, plays them and rolls for the games whose turn is over. Moves
+follow BackgammonEngine exactly: one die at a time, passing the turn when
+nothing can move, and finished games are refilled in place with a new game.
+
+Legal moves are a (25, 6, N) mask over (distance, die): distance d is the
+moving stone's distance from its home (1-24 on the points, 25 on the bar)
+for the side to move, so both sides share one set of rules. A policy is a
+function policy(engine, legal, relative) given the legal moves and
+relative() cells of all N games and returning the chosen distance and die
+arrays of length N; only the entries of games it plays are used.
+random_policy and simple_policy mirror RandomBot and SimpleHeuristicBot.
+
+    results = simulate(simple_policy, random_policy, games=100_000, seed=1)
+"""
+
+import time
+
+import numpy as np
+
+from backgammon.arbiter import ArbiterResults
+from backgammon.engine import BLACK_BAR, BLACK_HOME, NUM_SLOTS, WHITE_BAR, WHITE_HOME, Board
+
+_DISTANCES = np.arange(1, 26)
+_DIE_VALUES = np.arange(1, 7)
+# Distance a stone lands on for every (distance, die); 0 or less is borne off
+_TARGETS = _DISTANCES[:, None] - _DIE_VALUES[None, :]
+# Column of each distance 0-25 in the cells of each side: White's points count down to its home
+_WHITE_COLUMNS = np.array([BLACK_BAR] + [25 - distance for distance in range(1, 25)] + [WHITE_BAR])
+_BLACK_COLUMNS = np.array([WHITE_BAR] + list(range(1, 25)) + [BLACK_BAR])
+# Where legal_moves looks up whether each (distance, die) can land: the landing distance on the
+# board, column 26 for bearing off exactly and 26 + distance for bearing off with a larger die
+_LANDING = np.where(_TARGETS >= 1, _TARGETS, np.where(_TARGETS == 0, 26, 26 + _DISTANCES[:, None]))
+
+
+# Cells of the starting position
+def _starting_cells():
+    board = Board()
+    board.setup()
+    return np.frombuffer(board.cells.tobytes(), dtype=np.int8).copy()
+
+
+class BatchEngine:
+    """
+    N games played in lockstep. turn is +1 (White) or -1 (Black) per game,
+    dice the up to four dice left (0 for used ones) and winner 0 until the
+    game is won. Every game starts from `start` cells (the starting
+    position by default) with `turn` to roll, and games stop being refilled
+    once `games` have been started.
+    """
+
+    def __init__(self, size, games=None, seed=None, start=None, turn=-1):
+        self.size = size
+        self.start = _starting_cells() if start is None else np.asarray(start, dtype=np.int8)
+        self.start_turn = turn
+        self.rng = np.random.default_rng(seed)
+        # Stored slot-major, so each slot of all games is one contiguous row of cells.T
+        self.cells = np.zeros((NUM_SLOTS, size), dtype=np.int8).T
+        self.turn = np.zeros(size, dtype=np.int8)
+        self.dice = np.zeros((4, size), dtype=np.int8).T
+        self.winner = np.zeros(size, dtype=np.int8)
+        self.active = np.zeros(size, dtype=bool)
+
+        # Games left to start, None for no limit, and White's value of every finished game in order
+        self.remaining = games
+        self.values = []
+        self.moves = 0
+        self._rows = np.arange(size)
+
+        self.refill(self._rows)
+
+    # Starts a new game in each of rows while games are left to start; the other rows go idle
+    def refill(self, rows):
+        if self.remaining is not None:
+            started = rows[:self.remaining]
+            self.winner[rows[len(started):]] = 0
+            self.active[rows[len(started):]] = False
+            self.remaining -= len(started)
+            rows = started
+        self.load(rows, self.start, self.start_turn)
+
+    # Sets rows to the given (len(rows), 28) cells with turn to roll and rolls their dice
+    def load(self, rows, cells, turn):
+        self.cells[rows] = cells
+        self.turn[rows] = turn
+        self.winner[rows] = 0
+        self.active[rows] = True
+        self.roll(rows)
+
+    def roll(self, rows):
+        rolled = self.rng.integers(1, 7, size=(len(rows), 2), dtype=np.int8)
+        doubles = rolled[:, 0] == rolled[:, 1]
+        dice = np.zeros((len(rows), 4), dtype=np.int8)
+        dice[:, :2] = rolled
+        dice[doubles, 2:] = rolled[doubles, :1]
+        self.dice[rows] = dice
+
+    # Each game's cells seen from the side to move as a (26, N) array indexed by distance 0-25:
+    # its own stones positive, the opponent's negative
+    def relative(self):
+        cells = self.cells.T
+        black = -cells[_BLACK_COLUMNS]
+        return black + (self.turn > 0) * (cells[_WHITE_COLUMNS] - black)
+
+    # (25, 6, N) mask of the legal (distance, die) moves of every active game, and relative().
+    # Games run along the last axis so every step works on contiguous rows of N values
+    def legal_moves(self):
+        relative = self.relative()
+        own = relative[1:] > 0
+        count = self.size
+
+        # Points a stone can land on hold at most one opposing stone. Bearing off needs every stone
+        # home and either the exact die or a larger one moving the furthest stone
+        furthest = (own * _DISTANCES[:, None].astype(np.int8)).max(axis=0)
+        all_home = furthest <= 6
+        landing = np.empty((33, count), dtype=bool)
+        np.greater_equal(relative, -1, out=landing[:26])
+        landing[26] = all_home
+        np.equal(furthest, _DIE_VALUES[:, None], out=landing[27:])
+        landing[27:] &= all_home
+        legal = landing[_LANDING]
+
+        # Stones on the bar must enter before any other stone moves
+        movable = own & self.active
+        movable[:24] &= ~own[24]
+        has_die = (self.dice.T == _DIE_VALUES[:, None, None]).any(axis=1)
+        legal &= movable[:, None, :]
+        legal &= has_die
+        return legal, relative
+
+    # Plays the (distance, die) move of each of rows and uses up its die. Games whose turn is over
+    # pass to the other side with a new roll; won games get their winner
+    def play(self, rows, distance, die):
+        distance = distance.astype(np.intp)
+        sign = self.turn[rows]
+        white = sign > 0
+        target = distance - die
+        off = target <= 0
+
+        # Flat indices into the slot-major cells, one slot of every game after another
+        cells = self.cells.T.reshape(-1)
+        start = np.where(white, 25 - distance, distance) * self.size + rows
+        home = np.where(white, WHITE_HOME, BLACK_HOME) * self.size + rows
+        landing = np.where(off, home, np.where(white, 25 - target, target) * self.size + rows)
+        hit = ~off & (cells[landing] == -sign)
+        cells[start] -= sign
+        cells[landing] += sign * (1 + hit)
+        cells[np.where(white, BLACK_BAR, WHITE_BAR) * self.size + rows] -= sign * hit
+        self.winner[rows] = np.where(cells[home] == 15 * sign, sign, 0)
+
+        used = np.argmax(self.dice[rows] == die[:, None], axis=1)
+        self.dice[rows, used] = 0
+        self.moves += len(rows)
+
+        over = rows[(self.dice[rows] == 0).all(axis=1) & (self.winner[rows] == 0)]
+        self.pass_turn(over)
+
+    def pass_turn(self, rows):
+        self.turn[rows] = -self.turn[rows]
+        self.roll(rows)
+
+    # White's value (BackgammonEngine.game_value) of each finished game of rows
+    def game_values(self, rows):
+        cells = self.cells[rows]
+        white = self.winner[rows] > 0
+        loser_off = np.where(white, cells[:, BLACK_HOME], cells[:, WHITE_HOME]) != 0
+        white_trapped = (cells[:, BLACK_BAR] < 0) | (cells[:, 19:25] < 0).any(axis=1)
+        black_trapped = (cells[:, WHITE_BAR] > 0) | (cells[:, 1:7] > 0).any(axis=1)
+        trapped = np.where(white, white_trapped, black_trapped)
+        value = np.where(loser_off, 1, np.where(trapped, 3, 2))
+        return np.where(white, value, -value)
+
+    # One move in every active game: policies maps each side (+1, -1) to its policy. Games with no
+    # legal move pass, won games are recorded and refilled. Returns the number of games finished
+    def step(self, policies):
+        legal, relative = self.legal_moves()
+        movable = legal.any(axis=(0, 1))
+        self.pass_turn(self._rows[self.active & ~movable])
+
+        # Split the games by policy before any move, as playing can pass the turn
+        groups = {}
+        for side, policy in policies.items():
+            groups[policy] = groups.get(policy, False) | (self.turn == side)
+        groups = [(policy, self._rows[movable & turns]) for policy, turns in groups.items()]
+        for policy, rows in groups:
+            if len(rows):
+                distance, die = policy(self, legal, relative)
+                self.play(rows, distance[rows], die[rows])
+
+        finished = self._rows[self.winner != 0]
+        if len(finished):
+            self.values.extend(self.game_values(finished).tolist())
+            self.refill(finished)
+        return len(finished)
+
+    # Steps until every started game is finished; needs a game limit
+    def run(self, white_policy, black_policy):
+        if self.remaining is None:
+            raise ValueError("run() needs a BatchEngine with a game limit")
+        policies = {1: white_policy, -1: black_policy}
+        while self.active.any():
+            self.step(policies)
+        return self.values
+
+
+# Twice the change of a stack's score, per unit of stone weight, when a stack of count stones
+# loses or gains a stone: a blot counts half
+def _lose(count):
+    return (count == 1) - np.int16(2) - (count == 2)
+
+def _gain(count):
+    return (count == 1) + np.int16(2) - (count == 0)
+
+# Offset of legal keys in simple_policy, above any key a move can reach
+_LEGAL = 1 << 14
+# Row of simple_policy's landing scores for every (distance, die): the landing distance, or 26 to bear off
+_LANDING_SCORES = np.where(_TARGETS >= 1, _TARGETS, 26)
+
+# Running totals of counts down its first axis. A row at a time, as NumPy's own cumsum
+# along the first axis is several times slower
+def _cumulative(counts):
+    totals = np.empty(counts.shape, dtype=np.int16)
+    totals[0] = counts[0]
+    for row in range(1, len(counts)):
+        np.add(totals[row - 1], counts[row], out=totals[row])
+    return totals
+
+# A uniformly random legal move, like RandomBot: the k-th legal move for a uniform k,
+# found by counting moves per distance first and then within the chosen distance
+def random_policy(engine, legal, relative):
+    games = engine._rows
+    per_distance = legal.sum(axis=1, dtype=np.int8)
+    seen = _cumulative(per_distance)
+    pick = (engine.rng.random(len(games)) * seen[-1]).astype(np.int16)
+    # Games without a legal move count past the last move; their choice is never played
+    distance = np.minimum((seen <= pick).sum(axis=0, dtype=np.intp), 24)
+
+    pick -= seen[distance, games] - per_distance[distance, games]
+    seen = _cumulative(legal[distance, :, games].T)
+    return distance + 1, np.minimum((seen <= pick).sum(axis=0, dtype=np.intp), 5) + 1
+
+# The move with the best BackgammonBot.calculate_board_score for the side to move, like
+# SimpleHeuristicBot, ties going to the move it would try first.
+# A stone d pips from home scores 25 - d, half that as a blot, so each move changes the score only
+# on its start and target points, by an opponent blot it hits and by a stone borne off
+def simple_policy(engine, legal, relative):
+    white = engine.turn > 0
+    stones = np.maximum(relative, 0)
+    distances = np.arange(26, dtype=np.int16)[:, None]
+    dice = engine.dice
+    first_die = dice[engine._rows, np.argmax(dice != 0, axis=1)]
+    other_die = np.where(dice != first_die[:, None], dice, 0).max(axis=1)
+
+    # SimpleHeuristicBot tries moves by slot, then by die in the order the dice are left. Each move's
+    # key is 64 times twice its score change minus its place in that order, so the best key of a game
+    # is unique and decodes to its move
+    slot = distances[1:] + white * (25 - 2 * distances[1:])
+    leave = (25 - distances[1:]) * _lose(stones[1:]) * 64 - slot * 2
+    land = np.empty((27, engine.size), dtype=np.int16)
+    land[:26] = ((25 - distances) * _gain(stones) + (relative == -1) * distances) * 64
+    home = np.abs(np.where(white, engine.cells[:, WHITE_HOME], engine.cells[:, BLACK_HOME]))
+    land[26] = 25 * 64 * _gain(home)
+
+    # Middle-axis broadcasts are slow, so the leaving scores and die order go in one die at a time.
+    # Legal moves are lifted above every illegal one
+    key = land[_LANDING_SCORES]
+    for die in range(6):
+        key[:, die] += leave
+        key[:, die] -= first_die != die + 1
+    key += legal * np.int16(_LEGAL)
+
+    order = -key.reshape(150, -1).max(axis=0) % 64
+    slot = order // 2
+    return np.where(white, 25 - slot, slot), np.where(order % 2 == 0, first_die, other_die)
+
+# Plays games of white_policy against black_policy, batch_size at a time, and returns the results
+# with bot1 as White
+def simulate(white_policy, black_policy, games, batch_size=4096, seed=None) -> ArbiterResults:
+    start_time = time.perf_counter()
+    engine = BatchEngine(min(batch_size, games), games=games, seed=seed)
+    values = np.array(engine.run(white_policy, black_policy))
+
+    results = ArbiterResults()
+    results.bot1_wins = int((values > 0).sum())
+    results.bot2_wins = int((values < 0).sum())
+    results.simulation_time_ms = (time.perf_counter() - start_time) * 1000.0
+    return results
+
+# White's value of `games` playouts from cells with turn to roll, played batch_size at a time
+def playouts(cells, turn, white_policy, black_policy, games, batch_size=4096, seed=None):
+    engine = BatchEngine(min(batch_size, games), games=games, seed=seed, start=cells, turn=turn)
+    return np.array(engine.run(white_policy, black_policy))
@@ -0,0 +1,118 @@
+"""
+One-sided bearoff database.
+
+Every way of placing up to 15 stones on a player's six home points (54,264
+positions) is stored with the expected number of rolls needed to bear all of
+them off under the play that minimises it, and the probability of needing
+exactly n rolls. The file is built once with
+
+    python -m backgammon.bearoff [--output PATH]
+
+(see build.py) and memory-mapped read-only at runtime, so lookups are O(1)
+and every process using it shares the same pages.
+
+A position is given as counts: a 6-tuple whose entry d - 1 is the number of
+stones d pips from being borne off.
+"""
+
+import functools
+import math
+import mmap
+import os
+import struct
+from array import array
+
+from backgammon.engine import BLACK_BAR, WHITE_BAR, Player
+
+POINTS = 6
+CHECKERS = 15
+POSITIONS = math.comb(POINTS + CHECKERS, POINTS)
+
+# Rolls-to-finish probabilities are stored for 0 to MAX_ROLLS - 1 rolls
+MAX_ROLLS = 32
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "bearoff.bin")
+
+# File header: magic, version, points, checkers, stored rolls, position count
+_HEADER = struct.Struct("<4sHHHHI")
+_MAGIC = b"BGBO"
+_VERSION = 1
+
+# One record per position, in position_index order: expected rolls, then the
+# rolls-to-finish probabilities scaled to 0..65535
+_RECORD = struct.Struct(f"<f{MAX_ROLLS}H")
+_SCALE = 65535
+
+# _COMBINATIONS[n][k] = n choose k
+_COMBINATIONS = [[math.comb(n, k) for k in range(POINTS + 1)] for n in range(POINTS + CHECKERS + 1)]
+
+
+# Index of counts in the database, from 0 (all stones off) to POSITIONS - 1.
+# The stones and the six point boundaries form a row of 21 items; the index is the
+# colexicographic rank of the boundaries' places in that row
+def position_index(counts) -> int:
+    index = 0
+    place = -1
+    for k, count in enumerate(counts, 1):
+        place += count + 1
+        index += _COMBINATIONS[place][k]
+    return index
+
+# Bearoff counts of player's stones in cells (a board array or position bytes),
+# or None while any of them is outside the home board
+def side_counts(cells, player: Player):
+    if isinstance(cells, (bytes, bytearray)):
+        cells = array("b", cells)
+
+    if player == Player.WHITE:
+        if any(cells[slot] > 0 for slot in range(WHITE_BAR, 19)):
+            return None
+        return tuple(max(cells[25 - distance], 0) for distance in range(1, POINTS + 1))
+
+    if any(cells[slot] < 0 for slot in range(POINTS + 1, BLACK_BAR + 1)):
+        return None
+    return tuple(max(-cells[distance], 0) for distance in range(1, POINTS + 1))
+
+
+class BearoffDatabase:
+    """Read-only view of a bearoff file; see open_database() for a per-process shared instance."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, points, checkers, rolls, count = _HEADER.unpack_from(self._map, 0)
+        if (magic, version, points, checkers, rolls, count) != (_MAGIC, _VERSION, POINTS, CHECKERS, MAX_ROLLS,
+                                                                 POSITIONS):
+            self._map.close()
+            raise ValueError(f"{path} is not a version {_VERSION} bearoff database")
+
+    def close(self):
+        self._map.close()
+
+    def expected_rolls(self, counts) -> float:
+        return _RECORD.unpack_from(self._map, _HEADER.size + _RECORD.size * position_index(counts))[0]
+
+    # Probability of needing exactly n rolls to bear off, for n from 0 to MAX_ROLLS - 1
+    def distribution(self, counts) -> tuple:
+        record = _RECORD.unpack_from(self._map, _HEADER.size + _RECORD.size * position_index(counts))
+        return tuple(value / _SCALE for value in record[1:])
+
+    # Probability that the side with roller's counts, about to roll, bears off first
+    def race(self, roller, other) -> float:
+        rolls = self.distribution(roller)
+        others = self.distribution(other)
+
+        # The roller wins in n rolls whenever the other side needs n or more
+        probability = 0.0
+        remaining = 1.0
+        for n in range(MAX_ROLLS):
+            probability += rolls[n] * remaining
+            remaining -= others[n]
+        return min(1.0, max(0.0, probability))
+
+# The database at path, opened once per process
+@functools.lru_cache(maxsize=None)
+def open_database(path=DEFAULT_PATH) -> BearoffDatabase:
+    return BearoffDatabase(path)
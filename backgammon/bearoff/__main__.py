@@ -0,0 +1,19 @@
+import argparse
+import time
+
+from . import DEFAULT_PATH, POSITIONS
+from .build import build
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the one-sided bearoff database.")
+    parser.add_argument("--output", default=DEFAULT_PATH, help=f"file to write (default: {DEFAULT_PATH})")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    build(args.output)
+    print(f"Wrote {POSITIONS} positions to {args.output} in {time.perf_counter() - start_time:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
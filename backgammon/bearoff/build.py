@@ -0,0 +1,91 @@
+import os
+
+from backgammon.engine import ROLLS
+
+from . import (_HEADER, _MAGIC, _RECORD, _SCALE, _VERSION, CHECKERS, DEFAULT_PATH, MAX_ROLLS, POINTS, POSITIONS,
+               open_database, position_index)
+
+
+# Every position, ordered so a position comes after all positions it can move to
+def _all_counts():
+    def fill(prefix, left):
+        if len(prefix) == POINTS:
+            yield tuple(prefix)
+            return
+        for count in range(left + 1):
+            yield from fill(prefix + [count], left - count)
+
+    return sorted(fill([], CHECKERS), key=lambda counts: sum(d * c for d, c in enumerate(counts, 1)))
+
+# Positions reachable by playing one die. In the home board a die can always be played:
+# a stone moves down, bears off exactly, or, with none on higher points, bears off from the highest
+def _one_die(counts, die) -> set:
+    highest = max((d for d in range(1, POINTS + 1) if counts[d - 1]), default=0)
+    if highest == 0:
+        return {counts}
+
+    results = set()
+    for distance in range(1, highest + 1):
+        if counts[distance - 1] == 0 or (distance < die and distance != highest):
+            continue
+        after = list(counts)
+        after[distance - 1] -= 1
+        if distance > die:
+            after[distance - die - 1] += 1
+        results.add(tuple(after))
+    return results
+
+# Builds the database and writes it to path
+def build(path=DEFAULT_PATH):
+    positions = _all_counts()
+    indices = [position_index(counts) for counts in positions]
+    expected = [0.0] * POSITIONS
+    distributions = [None] * POSITIONS
+
+    # best[k][index][die] is the index of the lowest-expectation position left after playing die k + 1 times
+    best = [[None] * POSITIONS for _ in range(3)]
+
+    for counts, index in zip(positions, indices):
+        if index == 0:
+            expected[0] = 0.0
+            distributions[0] = [1.0] + [0.0] * (MAX_ROLLS - 1)
+            for level in best:
+                level[0] = [0] * (POINTS + 1)
+            continue
+
+        # Every move leaves fewer pips, so the successors are already complete
+        steps = [None] + [[position_index(after) for after in _one_die(counts, die)] for die in range(1, POINTS + 1)]
+        lowest = lambda candidates: min(candidates, key=expected.__getitem__)
+        for level in range(3):
+            if level == 0:
+                best[0][index] = [None] + [lowest(steps[die]) for die in range(1, POINTS + 1)]
+            else:
+                best[level][index] = [None] + [lowest([best[level - 1][step][die] for step in steps[die]])
+                                               for die in range(1, POINTS + 1)]
+
+        finals = []
+        for dice, probability in ROLLS:
+            if len(dice) == 4:
+                final = lowest([best[2][step][dice[0]] for step in steps[dice[0]]])
+            else:
+                high, low = dice
+                final = lowest([best[0][step][low] for step in steps[high]] +
+                               [best[0][step][high] for step in steps[low]])
+            finals.append((final, probability))
+
+        expected[index] = 1.0 + sum(probability * expected[final] for final, probability in finals)
+        distribution = [0.0] * MAX_ROLLS
+        for final, probability in finals:
+            after = distributions[final]
+            for n in range(MAX_ROLLS - 1):
+                distribution[n + 1] += probability * after[n]
+        distributions[index] = distribution
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, POINTS, CHECKERS, MAX_ROLLS, POSITIONS))
+        for index in range(POSITIONS):
+            file.write(_RECORD.pack(expected[index], *(round(p * _SCALE) for p in distributions[index])))
+
+    # A new file replaces whatever this process had open
+    open_database.cache_clear()
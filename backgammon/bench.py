@@ -0,0 +1,231 @@
+"""
+Benchmarks of the engine and bot hot paths.
+
+    python -m backgammon.bench [--output results.json] [--baseline base.json] [--threshold 0.1]
+
+Micro benchmarks time engine operations and each bot's calculate_move over a
+fixed corpus of positions taken from seeded RandomBot games; macro benchmarks
+time whole seeded games per bot pairing. Every figure is microseconds per
+operation, best of `repeat` runs, so lower is always better. Results can be
+saved as JSON and compared with a saved baseline: the exit status is 1 when
+any benchmark is slower than the baseline by more than the threshold.
+"""
+
+import argparse
+import copy
+import fnmatch
+import gc
+import json
+import platform
+import random
+import sys
+import time
+
+try:
+    from backgammon import batch
+except ImportError:  # pragma: no cover - numpy is optional
+    batch = None
+
+from backgammon.arbiter import BackgammonArbiter, seeded_engine
+from backgammon.bots import GPTHeuristicBot, RandomBot, SimpleHeuristicBot
+from backgammon.engine import BackgammonEngine, _generate_plays
+
+# Bots timed on their own, and pairings timed over whole games with the number of games
+BOTS = (RandomBot, SimpleHeuristicBot, GPTHeuristicBot)
+PAIRINGS = ((RandomBot, RandomBot, 100), (SimpleHeuristicBot, RandomBot, 40), (GPTHeuristicBot, SimpleHeuristicBot, 40))
+
+# Pairings of backgammon.batch policies timed over whole games, when NumPy is installed
+BATCH_PAIRINGS = (("random_policy", "random_policy", 4096), ("simple_policy", "random_policy", 4096))
+
+CORPUS_GAMES = 20
+
+
+# Engine states (engine position IDs) met in games of RandomBot against itself, with the seed
+def build_corpus(seed, games=CORPUS_GAMES) -> list:
+    corpus = []
+    bot = RandomBot()
+    for game in range(games):
+        engine = seeded_engine(seed, game)
+        engine.start()
+        while engine.winner is None:
+            corpus.append(engine.position_id())
+            engine.make_move(bot.calculate_move(engine))
+    return corpus
+
+# A fresh engine in each corpus state, rolling from its own seeded stream
+def _engines(corpus, seed) -> list:
+    engines = []
+    for number, position_id in enumerate(corpus):
+        engine = BackgammonEngine(rng=random.Random(f"{seed}:{number}"))
+        engine.load_position_id(position_id)
+        engines.append(engine)
+    return engines
+
+def _bench_generate_legal_moves(corpus, seed):
+    engines = _engines(corpus, seed)
+    start_time = time.perf_counter()
+    for engine in engines:
+        engine.generate_legal_moves()
+    return len(engines), time.perf_counter() - start_time
+
+def _bench_generate_plays(corpus, seed):
+    engines = _engines(corpus, seed)
+    _generate_plays.cache_clear()
+    start_time = time.perf_counter()
+    for engine in engines:
+        engine.generate_plays()
+    return len(engines), time.perf_counter() - start_time
+
+def _bench_make_move(corpus, seed):
+    engines = _engines(corpus, seed)
+    moves = [engine.legal_moves[0] for engine in engines]
+    start_time = time.perf_counter()
+    for engine, move in zip(engines, moves):
+        engine.make_move(move)
+    return len(engines), time.perf_counter() - start_time
+
+def _bench_apply_undo(corpus, seed):
+    engines = _engines(corpus, seed)
+    moves = [engine.legal_moves[0] for engine in engines]
+    start_time = time.perf_counter()
+    for engine, move in zip(engines, moves):
+        engine.apply(move)
+        engine.undo()
+    return len(engines), time.perf_counter() - start_time
+
+def _bench_deepcopy(corpus, seed):
+    engines = _engines(corpus, seed)
+    start_time = time.perf_counter()
+    for engine in engines:
+        copy.deepcopy(engine)
+    return len(engines), time.perf_counter() - start_time
+
+def _bench_bot(bot_class):
+    def bench(corpus, seed):
+        engines = _engines(corpus, seed)
+        bot = bot_class()
+        random.seed(seed)
+        start_time = time.perf_counter()
+        for engine in engines:
+            bot.calculate_move(engine)
+        return len(engines), time.perf_counter() - start_time
+    return bench
+
+def _bench_games(bot1_class, bot2_class, games):
+    def bench(corpus, seed):
+        arbiter = BackgammonArbiter(bot1_class(), bot2_class())
+        start_time = time.perf_counter()
+        arbiter.simulate(games, seed=seed)
+        return games, time.perf_counter() - start_time
+    return bench
+
+def _bench_batch_games(white_policy, black_policy, games):
+    def bench(corpus, seed):
+        start_time = time.perf_counter()
+        batch.simulate(getattr(batch, white_policy), getattr(batch, black_policy), games, seed=seed)
+        return games, time.perf_counter() - start_time
+    return bench
+
+# (name, function) of every benchmark. A function takes the corpus and the seed and returns
+# (operations, seconds) for the timed part only
+def benchmarks() -> list:
+    found = [
+        ("engine.generate_legal_moves", _bench_generate_legal_moves),
+        ("engine.generate_plays", _bench_generate_plays),
+        ("engine.make_move", _bench_make_move),
+        ("engine.apply_undo", _bench_apply_undo),
+        ("engine.deepcopy", _bench_deepcopy),
+    ]
+    found += [(f"bot.{bot_class.__name__}.calculate_move", _bench_bot(bot_class)) for bot_class in BOTS]
+    found += [(f"game.{bot1_class.__name__}-{bot2_class.__name__}", _bench_games(bot1_class, bot2_class, games))
+              for bot1_class, bot2_class, games in PAIRINGS]
+    if batch is not None:
+        found += [(f"batch.{white}-{black}", _bench_batch_games(white, black, games))
+                  for white, black, games in BATCH_PAIRINGS]
+    return found
+
+# Runs the benchmarks whose names match one of the only patterns (all when None) and returns
+# the JSON-ready results
+def run(seed=0, repeat=3, only=None, progress=None) -> dict:
+    corpus = build_corpus(seed)
+    results = {}
+    for name, bench in benchmarks():
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            continue
+
+        # Best of repeat runs, without the collector firing mid-measurement
+        best = None
+        for _ in range(repeat):
+            gc.collect()
+            gc.disable()
+            try:
+                operations, seconds = bench(corpus, seed)
+            finally:
+                gc.enable()
+            per_operation = seconds * 1e6 / operations
+            best = per_operation if best is None else min(best, per_operation)
+
+        results[name] = {"us_per_op": best, "ops": operations}
+        if progress is not None:
+            progress(name, best)
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "seed": seed,
+            "repeat": repeat,
+            "corpus": len(corpus),
+        },
+        "results": results,
+    }
+
+# (name, baseline us, current us, ratio, regressed) of every benchmark in both result sets.
+# A benchmark regressed when it takes more than 1 + threshold times as long as in the baseline
+def compare(results, baseline, threshold=0.1) -> list:
+    rows = []
+    for name, current in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        ratio = current["us_per_op"] / previous["us_per_op"]
+        rows.append((name, previous["us_per_op"], current["us_per_op"], ratio, ratio > 1.0 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the engine and bots.")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the corpus, dice and bots (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark, best kept (default: 3)")
+    parser.add_argument("--only", action="append", metavar="PATTERN",
+                        help="run only benchmarks matching this glob, e.g. 'engine.*' (repeatable)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="slowdown counted as a regression, as a fraction (default: 0.1)")
+    args = parser.parse_args(argv)
+
+    results = run(seed=args.seed, repeat=args.repeat, only=args.only,
+                  progress=lambda name, value: print(f"{name:<45} {value:>12.2f} us/op", flush=True))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        print()
+        print(f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+        for name, previous, current, ratio, slower in compare(results, baseline, args.threshold):
+            flag = "  REGRESSION" if slower else ""
+            print(f"{name:<45} {previous:>12.2f} {current:>12.2f} {ratio - 1.0:>+8.1%}{flag}")
+            regressed = regressed or slower
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
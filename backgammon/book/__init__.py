@@ -0,0 +1,89 @@
+"""
+Opening book.
+
+Every game starts from the same position, so the first turns of a game are
+the same few decisions over and over. The book stores a chosen play for the
+opening roll and the first replies, keyed by the position ID of the board,
+the side to move and the roll. The file is built once with
+
+    python -m backgammon.book [--output PATH] [--replies N] [--depth D]
+
+(see build.py) and read whole into a dict once per process by open_book(),
+so a lookup is one dict access.
+"""
+
+import functools
+import os
+import struct
+
+from backgammon.engine import MOVES, POSITION_ID_SIZE, BackgammonEngine, Player
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "book.bin")
+
+# File header: magic, version, entry count
+_HEADER = struct.Struct("<4sHI")
+_MAGIC = b"BGOB"
+_VERSION = 1
+
+# One entry per position and roll, sorted by key: the key, then the Move.id of each move of the
+# play in order, _NO_MOVE where the play has fewer than four
+_KEY_SIZE = POSITION_ID_SIZE + 2
+_ENTRY = struct.Struct(f"<{_KEY_SIZE}s4H")
+_NO_MOVE = 0xFFFF
+
+
+# Whether engine's player still has the whole roll to play
+def turn_start(engine: BackgammonEngine) -> bool:
+    values = engine.dice.values
+    return len(values) == 4 or (len(values) == 2 and values[0] != values[1])
+
+# Book key of engine's position at the start of a turn: the board's position ID, then a byte
+# with the player to move (1 white, 2 black), then a byte with the higher die in the low and
+# the lower die in the high nibble
+def book_key(engine: BackgammonEngine) -> bytes:
+    values = engine.dice.values
+    turn = 1 if engine.turn == Player.WHITE else 2
+    return engine.board.position_id() + bytes((turn, max(values) | min(values) << 4))
+
+
+class OpeningBook:
+    """An opening book file read into memory; see open_book() for a per-process shared instance."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as file:
+            data = file.read()
+
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path} is not a version {_VERSION} opening book")
+        magic, version, count = _HEADER.unpack_from(data, 0)
+        if (magic, version) != (_MAGIC, _VERSION) or len(data) != _HEADER.size + count * _ENTRY.size:
+            raise ValueError(f"{path} is not a version {_VERSION} opening book")
+
+        self.plays = {}
+        for key, *ids in _ENTRY.iter_unpack(data[_HEADER.size:]):
+            self.plays[key] = tuple(MOVES[id] for id in ids if id != _NO_MOVE)
+
+    def __len__(self):
+        return len(self.plays)
+
+    # The book's moves for engine's turn, or None when the position and roll are not in the book
+    # or the turn has already begun
+    def lookup(self, engine: BackgammonEngine) -> tuple:
+        if engine.turn is None or not turn_start(engine):
+            return None
+        return self.plays.get(book_key(engine))
+
+# Writes plays, a dict of book key -> moves, as a book file at path
+def write_book(path, plays):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION, len(plays)))
+        for key in sorted(plays):
+            ids = [move.id for move in plays[key]]
+            file.write(_ENTRY.pack(key, *ids, *[_NO_MOVE] * (4 - len(ids))))
+
+# The book at path, read once per process
+@functools.lru_cache(maxsize=None)
+def open_book(path=DEFAULT_PATH) -> OpeningBook:
+    return OpeningBook(path)
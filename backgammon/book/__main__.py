@@ -0,0 +1,27 @@
+import argparse
+import time
+
+from backgammon.bots import ExpectiminimaxBot
+
+from . import DEFAULT_PATH
+from .build import build
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the opening book.")
+    parser.add_argument("--output", default=DEFAULT_PATH, help=f"file to write (default: {DEFAULT_PATH})")
+    parser.add_argument("--replies", type=int, default=1,
+                        help="turns after the opening roll to cover, each 21 times larger (default: 1)")
+    parser.add_argument("--depth", type=int, default=2,
+                        help="ExpectiminimaxBot search depth used to choose the plays (default: 2)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    bot = ExpectiminimaxBot(depth=args.depth, time_limit=None)
+    count = build(bot, args.output, replies=args.replies,
+                  progress=lambda entries: print(f"\r{entries} entries", end="", flush=True))
+    print(f"\rWrote {count} entries to {args.output} in {time.perf_counter() - start_time:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
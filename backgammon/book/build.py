@@ -0,0 +1,64 @@
+from backgammon.engine import ROLLS, BackgammonEngine
+
+from . import DEFAULT_PATH, book_key, write_book
+
+
+# A fresh engine at the start of the game, with dice as the opening roll
+def _opening(dice) -> BackgammonEngine:
+    engine = BackgammonEngine()
+    engine.start()
+    engine.dice.values = list(dice)
+    engine.generate_legal_moves()
+    return engine
+
+# An engine in the position cells with turn to play dice
+def _position(cells, turn, dice) -> BackgammonEngine:
+    engine = BackgammonEngine()
+    engine.board.load(cells)
+    engine.turn = turn
+    engine.dice.values = list(dice)
+    engine.generate_legal_moves()
+    return engine
+
+# The moves bot plays for engine's whole turn. The moves are applied, so the engine is left
+# with the other player to move and no dice
+def _play_turn(bot, engine) -> tuple:
+    turn = engine.turn
+    moves = []
+    while engine.turn == turn and engine.winner is None and len(engine.legal_moves) > 0:
+        move = bot.calculate_move(engine)
+        engine.apply(move)
+        moves.append(move)
+    return tuple(moves)
+
+# Builds a book of bot's plays for every opening roll and, `replies` turns deep, for every roll
+# after the plays already in the book, and writes it to path. Returns the number of entries.
+# progress, when given, is called with the number of entries so far after each one
+def build(bot, path=DEFAULT_PATH, replies=1, progress=None) -> int:
+    plays = {}
+    frontier = []
+    for dice, _ in ROLLS:
+        engine = _opening(dice)
+        key = book_key(engine)
+        plays[key] = _play_turn(bot, engine)
+        frontier.append((engine.board.cells.tobytes(), engine.turn))
+        if progress is not None:
+            progress(len(plays))
+
+    for _ in range(replies):
+        positions = list(dict.fromkeys(frontier))
+        frontier = []
+        for cells, turn in positions:
+            for dice, _ in ROLLS:
+                engine = _position(cells, turn, dice)
+                key = book_key(engine)
+                moves = _play_turn(bot, engine)
+                if engine.winner is None:
+                    frontier.append((engine.board.cells.tobytes(), engine.turn))
+                if moves and key not in plays:
+                    plays[key] = moves
+                    if progress is not None:
+                        progress(len(plays))
+
+    write_book(path, plays)
+    return len(plays)
@@ -1,11 +1,24 @@
-from .base import BackgammonBot
+from .base import BackgammonBot, PlayBot
+from .bearoff_bot import BearoffBot, BearoffEvaluator
+from .expectiminimax_bot import ExpectiminimaxBot
 from .gpt_heuristic_bot import GPTHeuristicBot
+from .network_bot import NetworkBot, NetworkEvaluator
+from .opening_book import OpeningBookMixin
 from .random_bot import RandomBot
+from .rollout_bot import RolloutBot
 from .simple_heuristic_bot import SimpleHeuristicBot
 
 __all__ = [
     "BackgammonBot",
+    "PlayBot",
     "RandomBot",
     "SimpleHeuristicBot",
     "GPTHeuristicBot",
+    "ExpectiminimaxBot",
+    "RolloutBot",
+    "BearoffBot",
+    "BearoffEvaluator",
+    "NetworkBot",
+    "NetworkEvaluator",
+    "OpeningBookMixin",
 ]
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from backgammon.engine import BackgammonEngine, Move, Player, Point
+from backgammon.engine import BackgammonEngine, Move, Play, Player, Point
 
 class BackgammonBot(ABC):
     def __init__(self):
@@ -27,14 +27,50 @@ class BackgammonBot(ABC):
 
         return score
 
+    # Same score as summing point_score over the homes and points, worked out
+    # from the board's running features instead of a scan:
+    # a stone d pips from home on a point scores 25 - d, half that for a blot, and 0 on the bar
     def calculate_board_score(self, engine: BackgammonEngine) -> float:
+        board = engine.board
         score = 0.0
 
         # Get scores for homes. Bar is worth 0 so we don't need to add that
-        score += self.point_score(engine.board.home_white)
-        score += self.point_score(engine.board.home_black)
+        # White home has index 25, black home index 0
+        white = board.white
+        score += 12.5 if white.off == 1 else 25 * white.off
+        black = board.black
+        score -= 12.5 if black.off == 1 else 25 * black.off
 
         # Get scores for all points
-        for point in engine.board.points:
-            score += self.point_score(point)
-        return score
\ No newline at end of file
+        score += 25 * white.checkers - white.pips - 12.5 * white.blots + white.blot_pips / 2
+        score -= 25 * black.checkers - black.pips - 12.5 * black.blots + black.blot_pips / 2
+        return score
+
+# Base class for bots that pick a whole turn at once.
+# choose_play is called on the first die of a turn and the play's moves are then
+# handed out one calculate_move call at a time
+class PlayBot(BackgammonBot):
+    def __init__(self):
+        super().__init__()
+        self._plan = []
+        self._plan_hash = None
+
+    @abstractmethod
+    def choose_play(self, engine: BackgammonEngine) -> Play:
+        pass
+
+    def calculate_move(self, engine: BackgammonEngine) -> Move:
+        if not engine.legal_moves:
+            raise ValueError("Cannot select from empty legal moves")
+
+        # Keep following the plan as long as the engine is where the last move left it
+        if len(self._plan) == 0 or self._plan_hash != engine.position_hash:
+            self._plan = list(self.choose_play(engine).moves)
+        move = self._plan.pop(0)
+
+        # Remember the state the move leads to, so the next call can tell whether the plan still holds
+        if len(self._plan) > 0:
+            engine.apply(move)
+            self._plan_hash = engine.position_hash
+            engine.undo()
+        return move
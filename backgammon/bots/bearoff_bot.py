@@ -0,0 +1,159 @@
+import functools
+import math
+
+from backgammon.bearoff import DEFAULT_PATH, MAX_ROLLS, POINTS, open_database, side_counts
+from backgammon.engine import BLACK_BAR, ROLLS, WHITE_BAR, BackgammonEngine, Move, Play, Player
+
+from .base import BackgammonBot, PlayBot
+from .gpt_heuristic_bot import GPTHeuristicBot
+
+# Mean and variance of the pips one roll moves, a double moving four times its die
+_ROLL_MEAN = sum(sum(dice) * probability for dice, probability in ROLLS)
+_ROLL_VARIANCE = sum(sum(dice) ** 2 * probability for dice, probability in ROLLS) - _ROLL_MEAN ** 2
+
+
+# Probability that the side with rolls-to-finish distribution rolls, about to roll, bears off first,
+# as BearoffDatabase.race works it out
+def _race(rolls, others) -> float:
+    probability = 0.0
+    remaining = 1.0
+    for n, roll in enumerate(rolls):
+        probability += roll * remaining
+        remaining -= others[n] if n < len(others) else 0.0
+    return min(1.0, max(0.0, probability))
+
+# Probability that a normally distributed lead ends above zero
+def _normal_win(lead, variance) -> float:
+    if variance <= 0.0:
+        return 1.0 if lead > 0 else (0.5 if lead == 0 else 0.0)
+    return 0.5 * (1.0 + math.erf(lead / math.sqrt(2.0 * variance)))
+
+# The database at path, or None when there is no database file, found out once per process
+@functools.lru_cache(maxsize=None)
+def _find_database(path):
+    try:
+        return open_database(path)
+    except FileNotFoundError:
+        return None
+
+
+class BearoffEvaluator:
+    """
+    White-centric evaluator backed by the bearoff database, returning
+    White's chance of winning with engine.turn to roll scaled to
+    -scale..scale in every position, so the search sees no jump between
+    kinds of position:
+    - Once both sides are bearing off, the exact chance from the database
+    - In any other race, the same race worked out from each side's
+      rolls-to-finish distribution, with stones still coming in counted on
+      the six point and the distribution delayed by the rolls their pips
+      beyond it take at the mean roll
+    - With contact, or in any position when there is no database file,
+      `fallback` (GPTHeuristicBot's board score by default), read as
+      White's lead in pips and turned into a chance the same way.
+
+    Instances only keep the database path, so they can be sent to worker
+    processes, which open the file themselves.
+    """
+
+    def __init__(self, fallback=None, path=DEFAULT_PATH, scale=1000.0):
+        self.fallback = GPTHeuristicBot()._board_score_white if fallback is None else fallback
+        self.path = path
+        self.scale = scale
+
+    def __call__(self, engine: BackgammonEngine) -> float:
+        board = engine.board
+        white = side_counts(board.cells, Player.WHITE)
+        black = side_counts(board.cells, Player.BLACK)
+
+        database = _find_database(self.path)
+        if database is not None and white is not None and black is not None:
+            if engine.turn == Player.WHITE:
+                probability = database.race(white, black)
+            else:
+                probability = 1.0 - database.race(black, white)
+        elif database is not None and board.rear_black < board.rear_white:
+            roller = engine.turn
+            other = Player.BLACK if roller == Player.WHITE else Player.WHITE
+            probability = _race(self._rolls(database, board.cells, roller), self._rolls(database, board.cells, other))
+            if roller == Player.BLACK:
+                probability = 1.0 - probability
+        else:
+            # The fallback's pips, the roller's half roll ahead, over the spread of the rolls still to come
+            lead = self.fallback(engine) + (_ROLL_MEAN if engine.turn == Player.WHITE else -_ROLL_MEAN) / 2
+            variance = (board.white.pips + board.black.pips) / _ROLL_MEAN * _ROLL_VARIANCE
+            probability = _normal_win(lead, variance)
+        return self.scale * (2.0 * probability - 1.0)
+
+    # Probability of player needing exactly n rolls to bear off in a race, for n from 0 up. Stones
+    # outside the home board are counted on the six point, and the distribution is delayed by the rolls
+    # their pips beyond it take at the mean roll, so a stone coming home only moves it by what it moved
+    def _rolls(self, database, cells, player: Player) -> list:
+        counts = [0] * POINTS
+        outside = 0
+        if player == Player.WHITE:
+            for slot in range(WHITE_BAR, 25):
+                distance = 25 - slot
+                stones = max(cells[slot], 0)
+                counts[min(distance, POINTS) - 1] += stones
+                outside += stones * max(distance - POINTS, 0)
+        else:
+            for slot in range(1, BLACK_BAR + 1):
+                stones = max(-cells[slot], 0)
+                counts[min(slot, POINTS) - 1] += stones
+                outside += stones * max(slot - POINTS, 0)
+
+        # A fractional delay splits each probability between the two nearest roll counts
+        rolls = database.distribution(counts)
+        delay = outside / _ROLL_MEAN
+        whole = int(delay)
+        fraction = delay - whole
+        delayed = [0.0] * (MAX_ROLLS + whole + 1)
+        for n, probability in enumerate(rolls):
+            delayed[n + whole] += (1.0 - fraction) * probability
+            delayed[n + whole + 1] += fraction * probability
+        return delayed
+
+
+class BearoffBot(PlayBot):
+    """
+    Plays bear-offs exactly from the bearoff database:
+    - Once all its stones are home and no stones can meet any more, picks
+      the play with the best chance of winning if the opponent is bearing
+      off as well, and the play with the fewest expected rolls otherwise
+    - Hands every other position to `fallback` (GPTHeuristicBot by default),
+      and every position when there is no database file.
+    """
+
+    def __init__(self, fallback: BackgammonBot = None, path=DEFAULT_PATH):
+        super().__init__()
+        self.name = "BearoffBot"
+        self.fallback = GPTHeuristicBot() if fallback is None else fallback
+        self.path = path
+
+    def calculate_move(self, engine: BackgammonEngine) -> Move:
+        if self._bearing_off(engine) and _find_database(self.path) is not None:
+            return super().calculate_move(engine)
+        return self.fallback.calculate_move(engine)
+
+    def choose_play(self, engine: BackgammonEngine) -> Play:
+        database = open_database(self.path)
+        player = engine.turn
+        opponent = Player.BLACK if player == Player.WHITE else Player.WHITE
+
+        # The opponent is next to roll, so the best play leaves them the worst race
+        theirs = side_counts(engine.board.cells, opponent)
+        if theirs is not None:
+            key = lambda play: database.race(theirs, side_counts(play.position, player))
+        else:
+            key = lambda play: database.expected_rolls(side_counts(play.position, player))
+        return min(engine.generate_plays(), key=key)
+
+    def _bearing_off(self, engine: BackgammonEngine) -> bool:
+        # Past each other's rearmost stones there is no contact left
+        board = engine.board
+        if board.rear_black >= board.rear_white:
+            return False
+        if engine.turn == Player.WHITE:
+            return board.rear_white >= 19
+        return board.rear_black <= 6
@@ -0,0 +1,192 @@
+import math
+import time
+
+from backgammon.engine import ROLLS, BackgammonEngine, Play, Player, generate_plays
+
+from .base import PlayBot
+from .gpt_heuristic_bot import GPTHeuristicBot
+
+
+class _SearchTimeout(Exception):
+    """Raised inside the search once the time budget of a move is used up."""
+
+
+class ExpectiminimaxBot(PlayBot):
+    """
+    A search bot:
+    - Searches complete turns (BackgammonEngine.generate_plays) `depth`
+      plies deep, averaging over the 21 distinct rolls at chance nodes
+    - Prunes chance nodes with Star1 bounds and Star2 probing
+    - Scores leaves with a White-centric evaluator taking an engine
+      (GPTHeuristicBot's board score by default), clamped to `bounds`
+    - Deepens iteratively and stops when `time_limit` seconds are used,
+      keeping the result of the deepest completed search.
+
+    The bounds must contain every evaluator value; a win scores the upper
+    bound and a loss the lower one.
+    """
+
+    def __init__(self, evaluator=None, depth=2, time_limit=1.0, bounds=(-1000.0, 1000.0)):
+        super().__init__()
+        self.name = "ExpectiminimaxBot"
+        self.evaluator = GPTHeuristicBot()._board_score_white if evaluator is None else evaluator
+        self.depth = depth
+        self.time_limit = time_limit
+        self.lower, self.upper = bounds
+
+        # Depth of the deepest search completed for the last decision
+        self.last_depth = 0
+
+        self._scratch = BackgammonEngine()
+        self._statics = {}
+        self._ordered = {}
+        self._deadline = None
+
+    def choose_play(self, engine: BackgammonEngine) -> Play:
+        plays = engine.generate_plays()
+        self.last_depth = 1
+        if len(plays) == 1:
+            return plays[0]
+
+        # Evaluations are only kept for one decision
+        self._statics = {}
+        self._ordered = {}
+        self._deadline = None if self.time_limit is None else time.perf_counter() + self.time_limit
+
+        # Depth 1 is the static ordering itself, so there is always an answer
+        ordered = list(self._order(plays, engine.turn))
+        best = ordered[0]
+        for depth in range(2, self.depth + 1):
+            try:
+                best = self._search_root(ordered, engine.turn, depth)
+            except _SearchTimeout:
+                break
+            self.last_depth = depth
+
+            # Search the current best play first on the next iteration
+            ordered.remove(best)
+            ordered.insert(0, best)
+        return best
+
+    def _search_root(self, plays, player: Player, depth: int) -> Play:
+        opponent = Player.BLACK if player == Player.WHITE else Player.WHITE
+        alpha, beta = -math.inf, math.inf
+        best = None
+        for play in plays:
+            value = self._chance(play.position, opponent, depth - 1, alpha, beta)
+            if player == Player.WHITE and value > alpha:
+                alpha, best = value, play
+            elif player == Player.BLACK and value < beta:
+                beta, best = value, play
+        return best
+
+    def _chance(self, position: bytes, player: Player, depth: int, alpha: float, beta: float) -> float:
+        """
+        Expected value of `position` with `player` about to roll, searched
+        within the (alpha, beta) window. Outside the window a bound is returned.
+        """
+
+        value, terminal = self._static(position, player)
+        if terminal or depth == 0:
+            return value
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+
+        maximise = player == Player.WHITE
+        opponent = Player.BLACK if maximise else Player.WHITE
+        lowers = [self.lower] * len(ROLLS)
+        uppers = [self.upper] * len(ROLLS)
+        lower_total = self.lower
+        upper_total = self.upper
+
+        # Star2: searching only the first (best ordered) play of each roll bounds that roll's value
+        # from the mover's side, which can cut the node before any full search
+        for i, (dice, probability) in enumerate(ROLLS):
+            first = self._plays(position, player, dice)[0]
+            if maximise:
+                rest = lower_total - probability * lowers[i]
+                probe = self._chance(first.position, opponent, depth - 1, self.lower, (beta - rest) / probability)
+                lowers[i] = max(lowers[i], probe)
+                lower_total = rest + probability * lowers[i]
+                if lower_total >= beta:
+                    return lower_total
+            else:
+                rest = upper_total - probability * uppers[i]
+                probe = self._chance(first.position, opponent, depth - 1, (alpha - rest) / probability, self.upper)
+                uppers[i] = min(uppers[i], probe)
+                upper_total = rest + probability * uppers[i]
+                if upper_total <= alpha:
+                    return upper_total
+
+        # Star1: search each roll in the window that can still move the average across alpha or beta
+        for i, (dice, probability) in enumerate(ROLLS):
+            rest_lower = lower_total - probability * lowers[i]
+            rest_upper = upper_total - probability * uppers[i]
+            child_alpha = max(lowers[i], (alpha - rest_upper) / probability)
+            child_beta = min(uppers[i], (beta - rest_lower) / probability)
+
+            value = self._choose(position, player, dice, depth, child_alpha, child_beta)
+            lower_total = rest_lower + probability * value
+            upper_total = rest_upper + probability * value
+            if lower_total >= beta:
+                return lower_total
+            if upper_total <= alpha:
+                return upper_total
+        return lower_total
+
+    def _choose(self, position: bytes, player: Player, dice, depth: int, alpha: float, beta: float) -> float:
+        """Value of the best play for `player` with `dice`, White maximising and Black minimising."""
+
+        opponent = Player.BLACK if player == Player.WHITE else Player.WHITE
+        if player == Player.WHITE:
+            best = -math.inf
+            for play in self._plays(position, player, dice):
+                value = self._chance(play.position, opponent, depth - 1, max(alpha, best), beta)
+                if value > best:
+                    best = value
+                    if best >= beta:
+                        break
+        else:
+            best = math.inf
+            for play in self._plays(position, player, dice):
+                value = self._chance(play.position, opponent, depth - 1, alpha, min(beta, best))
+                if value < best:
+                    best = value
+                    if best <= alpha:
+                        break
+        return best
+
+    def _plays(self, position: bytes, player: Player, dice) -> tuple:
+        """Plays of `player` with `dice`, best static value first."""
+
+        key = (position, player, dice)
+        plays = self._ordered.get(key)
+        if plays is None:
+            plays = self._order(generate_plays(position, player, dice), player)
+            self._ordered[key] = plays
+        return plays
+
+    def _order(self, plays, player: Player) -> tuple:
+        opponent = Player.BLACK if player == Player.WHITE else Player.WHITE
+        return tuple(sorted(plays, key=lambda play: self._static(play.position, opponent)[0],
+                            reverse=player == Player.WHITE))
+
+    def _static(self, position: bytes, player: Player):
+        """(value, game over) of a position with `player` to roll, values clamped to the bounds."""
+
+        key = (position, player)
+        result = self._statics.get(key)
+        if result is None:
+            engine = self._scratch
+            engine.board.load(position)
+            if engine.board.rear_white == 25:
+                result = (self.upper, True)
+            elif engine.board.rear_black == 0:
+                result = (self.lower, True)
+            else:
+                engine.winner = None
+                engine.turn = player
+                value = self.evaluator(engine)
+                result = (min(self.upper, max(self.lower, value)), False)
+            self._statics[key] = result
+        return result
@@ -1,7 +1,11 @@
-import copy
 import random
 
-from backgammon.engine import BackgammonEngine, Move, Player
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from backgammon.engine import BLACK_BAR, BLACK_HOME, NUM_SLOTS, WHITE_BAR, WHITE_HOME, BackgammonEngine, Move, Player
 
 from .base import BackgammonBot
 
@@ -13,6 +17,10 @@ class GPTHeuristicBot(BackgammonBot):
       (plus bar, home, blots, and made points)
     - Chooses the move that gives the best immediate resulting position
       for the current player.
+
+    When numpy is installed all candidate positions are scored together
+    as one (N, 28) array; otherwise each candidate is scored in turn.
+    Both paths pick the same move.
     """
 
     def __init__(self):
@@ -23,16 +31,19 @@ class GPTHeuristicBot(BackgammonBot):
         if not engine.legal_moves:
             raise ValueError("Cannot select from empty legal moves")
 
+        if np is not None:
+            return self._calculate_move_batched(engine)
+
         player = engine.turn
         best_move = None
         best_value = float("-inf") if player == Player.WHITE else float("inf")
 
+        # Try each move in place and put the engine back afterwards
         for move in engine.legal_moves:
-            new_engine = copy.deepcopy(engine)
-            if not new_engine.attempt_move(move.start_point.index, move.final_point.index):
-                continue
+            engine.apply(move)
+            value = self._score_for_player(engine, player)
+            engine.undo()
 
-            value = self._score_for_player(new_engine, player)
             if player == Player.WHITE and value > best_value:
                 best_value = value
                 best_move = move
@@ -44,6 +55,52 @@ class GPTHeuristicBot(BackgammonBot):
             return random.choice(engine.legal_moves)
         return best_move
 
+    def _calculate_move_batched(self, engine: BackgammonEngine) -> Move:
+        """Build every candidate position as one array, then score them in one vectorised pass."""
+
+        moves = engine.legal_moves
+        sign = engine.turn.value
+        rows = np.arange(len(moves))
+        start = np.array([move.start_slot for move in moves], dtype=np.intp)
+        final = np.array([move.final_slot for move in moves], dtype=np.intp)
+        hit = np.array([move.hit for move in moves], dtype=bool)
+
+        # One copy of the current board per move, then each row plays its own move
+        positions = np.repeat(np.frombuffer(engine.board.cells, dtype=np.int8)[None, :], len(moves), axis=0)
+        positions[rows, start] -= sign
+        positions[rows, final] = np.where(hit, sign, positions[rows, final] + sign)
+        positions[hit, BLACK_BAR if sign > 0 else WHITE_BAR] -= sign
+
+        # Same win check as the engine: the mover has no stones left on the points
+        winners = np.where((positions[:, 1:25] * sign > 0).any(axis=1), 0, sign).astype(np.int8)
+
+        scores = self._board_scores_white(positions, winners)
+        return moves[self._best_index(scores, engine.turn)]
+
+    def _best_index(self, scores_white, player: Player) -> int:
+        """
+        Index of the candidate the scalar loop would pick: the first one with
+        the highest player score for White and the lowest for Black.
+        """
+
+        if player == Player.WHITE:
+            return int(np.argmax(scores_white))
+        return int(np.argmin(-scores_white))
+
+    def _board_scores_white(self, positions, winners):
+        """
+        Vectorised _board_score_white for an (N, 28) int8 array of board cells.
+
+        winners holds 1 / -1 where White / Black has won and 0 otherwise.
+        Every term is a sum over slots, so each cell value is looked up in
+        _SLOT_SCORES and the rows are summed.
+        """
+
+        scores = _SLOT_SCORES[positions + _SLOT_OFFSETS].sum(axis=1)
+        scores[winners == 1] = 1e9
+        scores[winners == -1] = -1e9
+        return scores
+
     def _score_for_player(self, engine: BackgammonEngine, player: Player) -> float:
         """Convert a white-centric score to the perspective of the current player."""
 
@@ -70,34 +127,41 @@ class GPTHeuristicBot(BackgammonBot):
         if engine.winner == Player.BLACK:
             return -1e9
 
-        pip_white = 0
-        pip_black = 0
+        # Read from the board's running features
+        white = board.white
+        black = board.black
 
-        for point in board.points:
-            if point.owner == Player.WHITE:
-                pip_white += (25 - point.index) * point.count
-            elif point.owner == Player.BLACK:
-                pip_black += point.index * point.count
+        home_bonus = 25 * (white.off - black.off)
+        blot_penalty = 1.5 * (black.blots - white.blots)
+        made_point_bonus = 0.5 * (white.made - black.made)
 
-        pip_white += 25 * board.bar_white.count
-        pip_black += 25 * board.bar_black.count
-
-        home_bonus = 25 * (board.home_white.count - board.home_black.count)
-
-        blot_penalty = 0.0
-        made_point_bonus = 0.0
-
-        for point in board.points:
-            if point.count == 1:
-                if point.owner == Player.WHITE:
-                    blot_penalty -= 1.5
-                elif point.owner == Player.BLACK:
-                    blot_penalty += 1.5
-            elif point.count >= 2:
-                if point.owner == Player.WHITE:
-                    made_point_bonus += 0.5
-                elif point.owner == Player.BLACK:
-                    made_point_bonus -= 0.5
-
-        pip_component = pip_black - pip_white
+        pip_component = black.pips - white.pips
         return pip_component + home_bonus + blot_penalty + made_point_bonus
+
+def _slot_score(slot: int, value: int) -> float:
+    """White-centric score of one slot holding value (positive = White stones)."""
+
+    if slot == WHITE_BAR:
+        return -25.0 * value
+    if slot == BLACK_BAR:
+        return -25.0 * value
+    if slot in (WHITE_HOME, BLACK_HOME):
+        return 25.0 * value
+
+    # Pip component, then the blot penalty and made point bonus
+    if value > 0:
+        score = -(25 - slot) * value
+        return score - 1.5 if value == 1 else score + 0.5
+    if value < 0:
+        score = -slot * value
+        return score + 1.5 if value == -1 else score - 0.5
+    return 0.0
+
+
+if np is not None:
+    # _SLOT_SCORES[slot * 31 + value + 15] is the score of slot holding value
+    _SLOT_SCORES = np.array(
+        [_slot_score(slot, value) for slot in range(NUM_SLOTS) for value in range(-15, 16)],
+        dtype=np.float64,
+    )
+    _SLOT_OFFSETS = np.arange(NUM_SLOTS, dtype=np.intp) * 31 + 15
@@ -0,0 +1,55 @@
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from backgammon.engine import BackgammonEngine, Play, Player
+from backgammon.network import Network, equity
+
+from .base import PlayBot
+
+
+class NetworkEvaluator:
+    """
+    White-centric evaluator returning the network's cubeless equity of the
+    position with engine.turn to roll, times `scale` (so +-2 equity spans
+    +-1000 by default).
+    """
+
+    def __init__(self, network: Network = None, scale=500.0):
+        self.network = Network() if network is None else network
+        self.scale = scale
+
+    def __call__(self, engine: BackgammonEngine) -> float:
+        outputs = self.network.evaluate(np.frombuffer(engine.board.cells, dtype=np.int8), engine.turn)
+        return self.scale * float(equity(outputs[0]))
+
+
+class NetworkBot(PlayBot):
+    """
+    A neural-network bot:
+    - Generates every complete play for the roll
+    - Evaluates all resulting positions, opponent to roll, in one batched
+      forward pass of `network` (random weights unless one is given,
+      see Network.load())
+    - Chooses the play with the best equity for the current player.
+
+    Requires numpy.
+    """
+
+    def __init__(self, network: Network = None):
+        super().__init__()
+        self.name = "NetworkBot"
+        self.network = Network() if network is None else network
+
+    def choose_play(self, engine: BackgammonEngine) -> Play:
+        plays = engine.generate_plays()
+        if len(plays) == 1:
+            return plays[0]
+
+        player = engine.turn
+        opponent = Player.BLACK if player == Player.WHITE else Player.WHITE
+        positions = np.frombuffer(b"".join(play.position for play in plays), dtype=np.int8)
+        equities = equity(self.network.evaluate(positions, opponent))
+        best = np.argmax(equities) if player == Player.WHITE else np.argmin(equities)
+        return plays[int(best)]
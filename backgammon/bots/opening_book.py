@@ -0,0 +1,53 @@
+import functools
+
+from backgammon.book import DEFAULT_PATH, open_book
+from backgammon.engine import BackgammonEngine, Move
+
+
+# The book at path, or None when there is no book file, found out once per process
+@functools.lru_cache(maxsize=None)
+def _find_book(path):
+    try:
+        return open_book(path)
+    except FileNotFoundError:
+        return None
+
+
+class OpeningBookMixin:
+    """
+    Plays the opening book's play while the game is in the book, for any bot:
+    - List it before the bot class, e.g.
+      class BookBot(OpeningBookMixin, ExpectiminimaxBot), and pass
+      `book_path` as a keyword if the book is not at the default path
+    - At the start of each turn looks the position and roll up in the book
+      and hands out its moves one calculate_move call at a time
+    - Hands every other position to the bot's own calculate_move, and
+      every position when there is no book file.
+
+    Instances only keep the book path, so they can be sent to worker
+    processes, which read the file once each.
+    """
+
+    def __init__(self, *args, book_path=DEFAULT_PATH, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.book_path = book_path
+        self._book_plan = []
+        self._book_hash = None
+
+    def calculate_move(self, engine: BackgammonEngine) -> Move:
+        # Keep following the book's play as long as the engine is where the last move left it
+        if len(self._book_plan) == 0 or self._book_hash != engine.position_hash:
+            book = _find_book(self.book_path)
+            play = None if book is None else book.lookup(engine)
+            self._book_plan = [] if play is None else list(play)
+        if len(self._book_plan) == 0 or self._book_plan[0] not in engine.legal_moves:
+            self._book_plan = []
+            return super().calculate_move(engine)
+        move = self._book_plan.pop(0)
+
+        # Remember the state the move leads to, so the next call can tell whether the play still holds
+        if len(self._book_plan) > 0:
+            engine.apply(move)
+            self._book_hash = engine.position_hash
+            engine.undo()
+        return move
@@ -0,0 +1,171 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from backgammon.engine import BackgammonEngine, Play, Player
+
+from .base import PlayBot
+from .gpt_heuristic_bot import GPTHeuristicBot
+from .simple_heuristic_bot import SimpleHeuristicBot
+
+
+class RolloutBot(PlayBot):
+    """
+    A Monte Carlo rollout bot:
+    - Keeps the `max_candidates` plays with the best static value
+    - Plays each candidate out `games` times with a fast base `policy`
+      (SimpleHeuristicBot by default) on both sides, stopping after
+      `truncate_after` turns when set and scoring the position with a
+      White-centric evaluator (GPTHeuristicBot's board score by default)
+    - Uses the same dice and policy seeds for rollout i of every candidate,
+      so candidates are compared on the same games
+    - Halves the candidates after each round, keeping the best, and doubles
+      the rollouts of the survivors until one play is left.
+
+    A won rollout scores the upper bound and a lost one the lower bound;
+    evaluator values are clamped to `bounds`. With workers > 1 the rollouts
+    of a round are spread over a process pool that is kept between moves
+    (see close()).
+    """
+
+    def __init__(self, policy=None, evaluator=None, games=16, max_candidates=8, truncate_after=None,
+                 workers=1, seed=None, bounds=(-1000.0, 1000.0)):
+        super().__init__()
+        self.name = "RolloutBot"
+        self.policy = SimpleHeuristicBot() if policy is None else policy
+        self.evaluator = GPTHeuristicBot()._board_score_white if evaluator is None else evaluator
+        self.games = games
+        self.max_candidates = max_candidates
+        self.truncate_after = truncate_after
+        self.workers = workers
+        self.lower, self.upper = bounds
+        self.rng = random.Random(seed)
+
+        # Rollouts per candidate and mean value of each candidate kept after the last decision
+        self.last_games = 0
+        self.last_values = {}
+
+        self._scratch = BackgammonEngine()
+        self._executor = None
+
+    def choose_play(self, engine: BackgammonEngine) -> Play:
+        plays = engine.generate_plays()
+        self.last_games = 0
+        self.last_values = {}
+        if len(plays) == 1:
+            return plays[0]
+
+        player = engine.turn
+        maximise = player == Player.WHITE
+        opponent = Player.BLACK if maximise else Player.WHITE
+
+        statics = {play: self._static(play.position, opponent) for play in plays}
+        candidates = sorted(plays, key=lambda play: statics[play][0], reverse=maximise)
+        candidates = candidates[:self.max_candidates]
+
+        # A winning play cannot be improved on
+        if statics[candidates[0]][1]:
+            return candidates[0]
+
+        base = self.rng.getrandbits(64)
+        totals = dict.fromkeys(candidates, 0.0)
+        games = dict.fromkeys(candidates, 0)
+        played = 0
+        count = self.games
+        while len(candidates) > 1:
+            for play, total in self._rollout_round(candidates, opponent, base, played, count):
+                totals[play] += total
+                games[play] += count
+            played += count
+
+            candidates.sort(key=lambda play: totals[play], reverse=maximise)
+            candidates = candidates[:math.ceil(len(candidates) / 2)]
+            count *= 2
+
+        self.last_games = played
+        self.last_values = {play: total / games[play] for play, total in totals.items()}
+        return candidates[0]
+
+    def close(self):
+        """Shuts down the process pool, if one was started."""
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __getstate__(self):
+        # The pool stays with the process that started it
+        state = self.__dict__.copy()
+        state["_executor"] = None
+        return state
+
+    def _rollout_round(self, plays, player: Player, base: int, first: int, count: int):
+        """(play, summed value) of rollouts first to first + count - 1 of every play, `player` rolling first."""
+
+        settings = (self.policy, self.evaluator, self.lower, self.upper, self.truncate_after)
+        if self.workers <= 1:
+            # Keep the caller's random state, the policy's seeds are only meant for the rollouts
+            state = random.getstate()
+            try:
+                return [(play, _rollouts(settings, play.position, player, base, first, count)) for play in plays]
+            finally:
+                random.setstate(state)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(settings,))
+        chunk = math.ceil(count / self.workers)
+        futures = [(play, self._executor.submit(_rollouts_in_worker, play.position, player, base, start,
+                                                min(chunk, first + count - start)))
+                   for play in plays for start in range(first, first + count, chunk)]
+        return [(play, future.result()) for play, future in futures]
+
+    def _static(self, position: bytes, player: Player):
+        """(value, game over) of a position with `player` to roll, values clamped to the bounds."""
+
+        engine = self._scratch
+        engine.board.load(position)
+        if engine.board.rear_white == 25:
+            return (self.upper, True)
+        if engine.board.rear_black == 0:
+            return (self.lower, True)
+        engine.winner = None
+        engine.turn = player
+        return (min(self.upper, max(self.lower, self.evaluator(engine))), False)
+
+# Summed value of rollouts first to first + count - 1 of position with player about to roll.
+# Rollout i always draws its dice and policy choices from the same seeds
+def _rollouts(settings, position: bytes, player: Player, base: int, first: int, count: int) -> float:
+    # The arbiter imports the bots package, so it is only imported once a rollout runs
+    from backgammon.arbiter import ArbiterResults, BackgammonArbiter, seeded_engine
+
+    policy, evaluator, lower, upper, max_plies = settings
+    arbiter = BackgammonArbiter(bot1=policy, bot2=policy)
+    results = ArbiterResults()
+    total = 0.0
+    for game in range(first, first + count):
+        engine = seeded_engine(base, game)
+        engine.board.load(position)
+        engine.turn = player
+        engine.roll()
+
+        arbiter.simulate_single_game(white_bot=policy, black_bot=policy, results=results, engine=engine,
+                                     new_game=False, max_plies=max_plies)
+        if engine.winner == Player.WHITE:
+            total += upper
+        elif engine.winner == Player.BLACK:
+            total += lower
+        else:
+            total += min(upper, max(lower, evaluator(engine)))
+    return total
+
+# Rollout settings of a pool worker, sent once when the worker starts
+_worker_settings = None
+
+def _init_worker(settings):
+    global _worker_settings
+    _worker_settings = settings
+
+# Process pool entry point
+def _rollouts_in_worker(position: bytes, player: Player, base: int, first: int, count: int) -> float:
+    return _rollouts(_worker_settings, position, player, base, first, count)
@@ -1,4 +1,3 @@
-import copy
 import random
 
 from backgammon.engine import BackgammonEngine, Move, Player
@@ -21,12 +20,12 @@ class SimpleHeuristicBot(BackgammonBot):
         best_score = float("-inf") if player == Player.WHITE else float("inf")
         selected_move = None
 
+        # Try each move in place and put the engine back afterwards
         for move in engine.legal_moves:
-            new_engine = copy.deepcopy(engine)
-            if not new_engine.attempt_move(move.start_point.index, move.final_point.index):
-                raise ValueError("Unable to apply legal move to engine copy")
+            engine.apply(move)
+            score = self.calculate_board_score(engine)
+            engine.undo()
 
-            score = self.calculate_board_score(new_engine)
             if player == Player.WHITE and score > best_score:
                 best_score = score
                 selected_move = move
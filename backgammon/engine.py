@@ -3,9 +3,13 @@
 # Date: November 7, 2025
 # Brief: Simple implementation of a backgammon engine
 
+from array import array
 from enum import Enum
+from functools import lru_cache
+import itertools
 import random
 import copy
+import warnings
 
 # ==============================================================
 # | 12| 11| 10|  9|  8|  7| BAR |  6|  5|  4|  3|  2|  1| HOME |
@@ -27,77 +31,148 @@ import copy
 
 # White Bar : 0
 # Black Bar: 25
-# White Home: 25
-# Black Home: 0
+# White Home: 25 (slot 26)
+# Black Home: 0 (slot 27)
+
+# Slot layout of Board.cells. Points 1-24 live at the slot with the same
+# number; the bars keep their point index and the homes get the two extra slots.
+WHITE_BAR = 0
+BLACK_BAR = 25
+WHITE_HOME = 26
+BLACK_HOME = 27
+NUM_SLOTS = 28
 
 class Player(Enum):
     WHITE = 1
     BLACK = -1
 
+# Zobrist keys. A slot holding value v contributes _ZOBRIST_CELLS[slot][v]; negative values
+# index from the end of the list, so every value from -15 to 15 has its own key and 0 has none.
+# The keys come from a fixed seed so every process hashes positions the same way
+_zobrist_rng = random.Random(0x5EED_BACC)
+_ZOBRIST_CELLS = [[0] + [_zobrist_rng.getrandbits(64) for _ in range(30)] for _ in range(NUM_SLOTS)]
+_ZOBRIST_WHITE_TO_MOVE = _zobrist_rng.getrandbits(64)
+# _ZOBRIST_DICE[die][n] is the key of having n dice left showing die
+_ZOBRIST_DICE = [[0] + [_zobrist_rng.getrandbits(64) for _ in range(4)] for _ in range(7)]
+del _zobrist_rng
+
+# Thin view of one slot of Board.cells.
+# The sign of the stored value is the owner (+ white, - black), the magnitude is the count.
 class Point:
-    def __init__(self, index, owner=None, count=0):
+    __slots__ = ("board", "index", "slot")
+
+    def __init__(self, board, index, slot=None):
+        self.board = board
         self.index = index
-        self.owner = owner
-        self.count = count
+        self.slot = index if slot is None else slot
+
+    @property
+    def owner(self):
+        value = self.board.cells[self.slot]
+        if value > 0:
+            return Player.WHITE
+        if value < 0:
+            return Player.BLACK
+        return None
 
-    def __deepcopy__(self, memo):
-        cls = self.__class__
-        new_obj = cls.__new__(cls)
-        memo[id(self)] = new_obj
-        new_obj.index = self.index
-        new_obj.owner = self.owner
-        new_obj.count = self.count
-        return new_obj
+    @property
+    def count(self):
+        return abs(self.board.cells[self.slot])
+
+    @count.setter
+    def count(self, count):
+        owner = self.owner
+        if owner is None and count != 0:
+            raise ValueError("Cannot set a count on a point without an owner")
+        self.board.set_cell(self.slot, count * owner.value if count else 0)
 
     def remove_stone(self):
-        if self.count > 0:
-            self.count -= 1
-            if self.count == 0:
-                self.owner = None
+        value = self.board.cells[self.slot]
+        if value > 0:
+            self.board.set_cell(self.slot, value - 1)
+        elif value < 0:
+            self.board.set_cell(self.slot, value + 1)
         else:
             raise ValueError("Trying to remove from an empty point")
         
     def add_stone(self, owner):
-        if self.owner == None or self.owner == owner:
-            self.count += 1
-        elif self.owner != owner and self.count == 1:
-            self.count = 1
+        value = self.board.cells[self.slot] * owner.value
+        if value >= 0:
+            self.board.set_cell(self.slot, (value + 1) * owner.value)
+        elif value == -1:
+            self.board.set_cell(self.slot, owner.value)
         else:
             raise ValueError("add_stone")
-        self.owner = owner
 
     def set_stones(self, count, owner):
-        self.owner = owner
-        self.count = count
+        self.board.set_cell(self.slot, 0 if owner is None else count * owner.value)
 
     def clear(self):
-        self.owner = None
-        self.count = 0
+        self.board.set_cell(self.slot, 0)
 
+# Bars and homes always belong to the same player, even when empty
 class Home(Point):
-    def __init__(self, index, owner=None, count=0):
-        super().__init__(index=index, owner=owner, count=count)
+    __slots__ = ("_owner",)
+
+    def __init__(self, board, index, slot, owner):
+        super().__init__(board=board, index=index, slot=slot)
+        self._owner = owner
+
+    @property
+    def owner(self):
+        return self._owner
+
+    @property
+    def count(self):
+        return abs(self.board.cells[self.slot])
 
-class Bar(Point):
-    def __init__(self, index, owner=None, count=0):
-        super().__init__(index=index, owner=owner, count=count)
+    @count.setter
+    def count(self, count):
+        self.board.set_cell(self.slot, count * self._owner.value)
 
+class Bar(Home):
+    __slots__ = ()
+
+# Dice draw from rng (anything with a randint method, the random module by default),
+# or replay a pre-generated sequence of (die1, die2) rolls when one is given
 class Dice:
-    def __init__(self):
+    __slots__ = ("values", "rng", "sequence")
+
+    def __init__(self, rng=None, sequence=None):
         self.values = []
+        self.rng = random if rng is None else rng
+        self.sequence = None if sequence is None else iter(sequence)
     
     def __deepcopy__(self, memo):
         cls = self.__class__
         new_obj = cls.__new__(cls)
         memo[id(self)] = new_obj
         new_obj.values = list(self.values)
+
+        # Copies roll from their own copy of the stream, so looking ahead on a copy never uses up the
+        # dice of the original. The random module itself can't be copied, only its state
+        if self.rng is random:
+            new_obj.rng = random.Random()
+            new_obj.rng.setstate(random.getstate())
+        else:
+            new_obj.rng = copy.deepcopy(self.rng, memo)
+        if self.sequence is None:
+            new_obj.sequence = None
+        else:
+            self.sequence, new_obj.sequence = itertools.tee(self.sequence)
         return new_obj
 
     def roll(self):
         self.values.clear()
 
-        die1 = random.randint(1, 6)
-        die2 = random.randint(1, 6)
+        if self.sequence is not None:
+            roll = next(self.sequence, None)
+            if roll is None:
+                raise ValueError("Dice sequence exhausted")
+            die1, die2 = roll
+        else:
+            die1 = self.rng.randint(1, 6)
+            die2 = self.rng.randint(1, 6)
 
         # Check if we rolled two of the same dice
         if die1 == die2:
@@ -113,90 +188,320 @@ class Dice:
     def remove_die(self, die):
         self.values.remove(die)
 
-class Board:
+# Pip distance of one stone on each slot, for white and black
+_WHITE_PIPS = [25 - slot for slot in range(25)] + [0, 0, 0]
+_BLACK_PIPS = [slot for slot in range(26)] + [0, 0]
+
+# Position IDs list each player's points from their own ace point to their 24 point, then their bar
+POSITION_ID_SIZE = 10
+ENGINE_ID_SIZE = POSITION_ID_SIZE + 2
+_WHITE_ID_SLOTS = tuple(range(24, 0, -1)) + (WHITE_BAR,)
+_BLACK_ID_SLOTS = tuple(range(1, 25)) + (BLACK_BAR,)
+
+# Running evaluation counters of one player, kept up to date by the board
+class Features:
+    __slots__ = ("pips", "blots", "blot_pips", "made", "checkers", "bar", "off")
+
     def __init__(self):
-        # Points 1-24
-        self.points = [Point(index=i+1) for i in range(24)]
+        self.pips = 0       # Pip count, 25 for a stone on the bar
+        self.blots = 0      # Points holding a single stone
+        self.blot_pips = 0  # Pips of the stones on those points
+        self.made = 0       # Points holding 2 or more stones
+        self.checkers = 0   # Stones still in play (points and bar)
+        self.bar = 0        # Stones on the bar
+        self.off = 0        # Stones borne off
+
+    def copy(self) -> "Features":
+        new_obj = Features()
+        new_obj.pips = self.pips
+        new_obj.blots = self.blots
+        new_obj.blot_pips = self.blot_pips
+        new_obj.made = self.made
+        new_obj.checkers = self.checkers
+        new_obj.bar = self.bar
+        new_obj.off = self.off
+        return new_obj
 
-        # Bars 0 and 25
-        self.bar_white = Bar(index=0, owner=Player.WHITE)
-        self.bar_black = Bar(index=25, owner=Player.BLACK)
+# Board.cells should only be written through set_cell, move_stone, unmove_stone or load
+# so that the state kept alongside it (Zobrist hash, features, rearmost stones) stays in step
+class Board:
+    __slots__ = ("cells", "zobrist", "white", "black", "rear_white", "rear_black", "_views", "_points")
 
-        # Home 25 and 0
-        self.home_white = Home(index=25, owner=Player.WHITE)
-        self.home_black = Home(index=0, owner=Player.BLACK)
+    def __init__(self):
+        # Whole position as one signed byte per slot (see slot layout above)
+        self.cells = array("b", bytes(NUM_SLOTS))
+        self.zobrist = 0
+
+        # Evaluation counters per player
+        self.white = Features()
+        self.black = Features()
+
+        # Index of each player's stone furthest from home, bar included.
+        # The player's home index (25 / 0) once every stone is off
+        self.rear_white = 25
+        self.rear_black = 0
+
+        # Point views are only built when someone asks for them
+        self._views = None
+        self._points = None
     
     def __deepcopy__(self, memo):
         cls = self.__class__
         new_obj = cls.__new__(cls)
         memo[id(self)] = new_obj
 
-        new_obj.points = [copy.deepcopy(p, memo) for p in self.points]
-        new_obj.bar_white = copy.deepcopy(self.bar_white, memo)
-        new_obj.bar_black = copy.deepcopy(self.bar_black, memo)
-        new_obj.home_white = copy.deepcopy(self.home_white, memo)
-        new_obj.home_black = copy.deepcopy(self.home_black, memo)
+        new_obj.cells = array("b", self.cells)
+        new_obj.zobrist = self.zobrist
+        new_obj.white = self.white.copy()
+        new_obj.black = self.black.copy()
+        new_obj.rear_white = self.rear_white
+        new_obj.rear_black = self.rear_black
+        new_obj._views = None
+        new_obj._points = None
         return new_obj
 
+    # One view per slot, indexed by slot
+    @property
+    def views(self) -> list:
+        if self._views is None:
+            views = [Point(board=self, index=i) for i in range(NUM_SLOTS)]
+            views[WHITE_BAR] = Bar(board=self, index=0, slot=WHITE_BAR, owner=Player.WHITE)
+            views[BLACK_BAR] = Bar(board=self, index=25, slot=BLACK_BAR, owner=Player.BLACK)
+            views[WHITE_HOME] = Home(board=self, index=25, slot=WHITE_HOME, owner=Player.WHITE)
+            views[BLACK_HOME] = Home(board=self, index=0, slot=BLACK_HOME, owner=Player.BLACK)
+            self._views = views
+            self._points = views[1:25]
+        return self._views
+
+    # Points 1-24
+    @property
+    def points(self) -> list:
+        if self._points is None:
+            self.views
+        return self._points
+
+    # Bars 0 and 25
+    @property
+    def bar_white(self) -> Bar:
+        return self.views[WHITE_BAR]
+
+    @property
+    def bar_black(self) -> Bar:
+        return self.views[BLACK_BAR]
+
+    # Home 25 and 0
+    @property
+    def home_white(self) -> Home:
+        return self.views[WHITE_HOME]
+
+    @property
+    def home_black(self) -> Home:
+        return self.views[BLACK_HOME]
+
     def clear(self):
-        for point in self.points:
-            point.clear()
-        self.bar_white.clear()
-        self.bar_black.clear()
-        self.home_white.clear()
-        self.home_black.clear()
-        self.bar_white.owner = Player.WHITE
-        self.bar_black.owner = Player.BLACK
-        self.home_white.owner = Player.WHITE
-        self.home_black.owner = Player.BLACK
+        self.cells[:] = array("b", bytes(NUM_SLOTS))
+        self.rehash()
 
     def setup(self):
         # Clear board
         self.clear()
 
         # Set up board to the standard state
-        self.points[0].set_stones(2, Player.WHITE)
-        self.points[5].set_stones(5, Player.BLACK)
-        self.points[7].set_stones(3, Player.BLACK)
-        self.points[11].set_stones(5, Player.WHITE)
-        self.points[12].set_stones(5, Player.BLACK)
-        self.points[16].set_stones(3, Player.WHITE)
-        self.points[18].set_stones(5, Player.WHITE)
-        self.points[23].set_stones(2, Player.BLACK)
+        cells = self.cells
+        cells[1] = 2
+        cells[6] = -5
+        cells[8] = -3
+        cells[12] = 5
+        cells[13] = -5
+        cells[17] = 3
+        cells[19] = 5
+        cells[24] = -2
+        self.rehash()
+
+    # Replaces the whole position with cells (28 signed values or their bytes)
+    def load(self, cells):
+        self.cells = array("b", cells)
+        self.rehash()
+
+    # 10-byte position ID in the style of GNU Backgammon: for White and then Black, each of the
+    # 25 slots in _*_ID_SLOTS order adds one 1 bit per stone and a closing 0 bit. The 80 bits are
+    # stored least significant first; borne-off stones are whatever is missing from 15
+    def position_id(self) -> bytes:
+        cells = self.cells
+        key = 0
+        bit = 0
+        for slots, sign in ((_WHITE_ID_SLOTS, 1), (_BLACK_ID_SLOTS, -1)):
+            for slot in slots:
+                count = cells[slot] * sign
+                if count > 0:
+                    key |= ((1 << count) - 1) << bit
+                    bit += count
+                bit += 1
+        return key.to_bytes(POSITION_ID_SIZE, "little")
+
+    # Replaces the whole position with the one position_id() describes
+    def load_position_id(self, position_id:bytes):
+        if len(position_id) != POSITION_ID_SIZE:
+            raise ValueError(f"Position ID must be {POSITION_ID_SIZE} bytes")
+
+        key = int.from_bytes(position_id, "little")
+        cells = array("b", bytes(NUM_SLOTS))
+        for slots, sign, home_slot in ((_WHITE_ID_SLOTS, 1, WHITE_HOME), (_BLACK_ID_SLOTS, -1, BLACK_HOME)):
+            total = 0
+            for slot in slots:
+                count = 0
+                while key & 1:
+                    count += 1
+                    key >>= 1
+                key >>= 1
+                if count:
+                    # Both players on one point would make this a different slot's run
+                    if cells[slot]:
+                        raise ValueError("Invalid position ID")
+                    cells[slot] = sign * count
+                    total += count
+
+            if total > 15:
+                raise ValueError("Invalid position ID")
+            cells[home_slot] = sign * (15 - total)
+        self.load(cells)
+
+    # Recomputes the state kept alongside cells from scratch
+    def rehash(self):
+        zobrist = 0
+        self.white = Features()
+        self.black = Features()
+        for slot, value in enumerate(self.cells):
+            zobrist ^= _ZOBRIST_CELLS[slot][value]
+            if value != 0:
+                self._tally(slot, value, 1)
+        self.zobrist = zobrist
+        self.rear_white = self._scan_rear_white(0)
+        self.rear_black = self._scan_rear_black(BLACK_BAR)
+
+    def set_cell(self, slot, value):
+        old = self.cells[slot]
+        self.cells[slot] = value
+        keys = _ZOBRIST_CELLS[slot]
+        self.zobrist ^= keys[old] ^ keys[value]
+        if old != 0:
+            self._tally(slot, old, -1)
+        if value != 0:
+            self._tally(slot, value, 1)
+
+        # Homes don't count towards the rearmost stone
+        if slot > BLACK_BAR:
+            return
+        if value > 0:
+            if slot < self.rear_white:
+                self.rear_white = slot
+        elif old > 0 and slot == self.rear_white:
+            self.rear_white = self._scan_rear_white(slot + 1)
+        if value < 0:
+            if slot > self.rear_black:
+                self.rear_black = slot
+        elif old < 0 and slot == self.rear_black:
+            self.rear_black = self._scan_rear_black(slot - 1)
+
+    # First slot from start up to 24 holding a white stone, else white home (25)
+    def _scan_rear_white(self, start):
+        cells = self.cells
+        for slot in range(start, 25):
+            if cells[slot] > 0:
+                return slot
+        return 25
+
+    # First slot from start down to 1 holding a black stone, else black home (0)
+    def _scan_rear_black(self, start):
+        cells = self.cells
+        for slot in range(start, 0, -1):
+            if cells[slot] < 0:
+                return slot
+        return 0
+
+    # Adds (direction 1) or removes (direction -1) the contribution of slot holding value to the features
+    def _tally(self, slot, value, direction):
+        if value > 0:
+            features = self.white
+            count = value
+            pips = _WHITE_PIPS[slot]
+        else:
+            features = self.black
+            count = -value
+            pips = _BLACK_PIPS[slot]
+
+        if slot == WHITE_HOME or slot == BLACK_HOME:
+            features.off += direction * count
+            return
+
+        features.checkers += direction * count
+        features.pips += direction * count * pips
+        if slot == WHITE_BAR or slot == BLACK_BAR:
+            features.bar += direction * count
+        elif count == 1:
+            features.blots += direction
+            features.blot_pips += direction * pips
+        else:
+            features.made += direction
+
+    # Live evaluation counters of player. Read them, don't write them
+    def features(self, player:Player) -> Features:
+        return self.white if player == Player.WHITE else self.black
+
+    # Moves one stone of the player with sign from start_slot to final_slot.
+    # On a hit the lone enemy stone on final_slot goes to its bar
+    def move_stone(self, start_slot, final_slot, sign, hit):
+        cells = self.cells
+        self.set_cell(start_slot, cells[start_slot] - sign)
+        if hit:
+            bar_slot = BLACK_BAR if sign > 0 else WHITE_BAR
+            self.set_cell(bar_slot, cells[bar_slot] - sign)
+            self.set_cell(final_slot, sign)
+        else:
+            self.set_cell(final_slot, cells[final_slot] + sign)
+
+    # Reverses move_stone
+    def unmove_stone(self, start_slot, final_slot, sign, hit):
+        cells = self.cells
+        if hit:
+            bar_slot = BLACK_BAR if sign > 0 else WHITE_BAR
+            self.set_cell(final_slot, -sign)
+            self.set_cell(bar_slot, cells[bar_slot] + sign)
+        else:
+            self.set_cell(final_slot, cells[final_slot] - sign)
+        self.set_cell(start_slot, cells[start_slot] + sign)
 
     def get_point(self, index) -> Point:
         if index < 1 or index > 24:
             raise ValueError("Index out of bounds")
-        return self.points[index-1]
+        return self.views[index]
+
+    # Returns the index of the point (or bar) with a stone of player furthest from its home,
+    # or the index of the player's home if there are no stones left in play
+    def furthest_index(self, player:Player) -> int:
+        if player == Player.WHITE:
+            return self.rear_white
+        if player == Player.BLACK:
+            return self.rear_black
+        return None
     
-    # Returns the point with a stone of player furthest from its home
+    # Returns the point (or bar) with a stone of player furthest from its home
     def get_point_furthest_from_home(self, player:Player) -> Point:
-        # White: Start at index = 1
-        if player == Player.WHITE:
-            for point in self.points:
-                if point.owner == Player.WHITE:
-                    return point
+        index = self.furthest_index(player)
+        if index is None:
+            return None
+        if player == Player.WHITE and index == 25:
             return self.home_white
-        
-        # Black: Start at index = 24
-        if player == Player.BLACK:
-            for point in reversed(self.points):
-                if point.owner == Player.BLACK:
-                    return point
+        if player == Player.BLACK and index == 0:
             return self.home_black
-
-        return None
+        return self.views[index]
 
     # Returns true if all stones of player are home, false otherwise
     def are_all_player_stones_home(self, player) -> bool:
         if player == Player.WHITE:
-            if self.get_point_furthest_from_home(Player.WHITE).index > 18:
-                return True
-            return False
+            return self.rear_white > 18
         elif player == Player.BLACK:
-            if self.get_point_furthest_from_home(Player.BLACK).index < 7:
-                return True
-            return False
+            return self.rear_black < 7
         else:
             raise ValueError("Unknown Player enum")
     
@@ -209,39 +514,159 @@ class Board:
         else:
             raise ValueError
 
+# One possible single die move of a player. Moves hold no reference to a board:
+# every move exists exactly once in MOVE_TABLE, so legal move lists share those
+# objects and moves can be compared by identity, even after pickling
+# What the deprecated Move.start_point and Move.final_point give since moves stopped pointing at
+# board views: the index and slot of that end of the move, read-only. A move belongs to no board,
+# so the view itself is board.views[slot] on the board it is played on
+class MoveEnd:
+    __slots__ = ("index", "slot")
+
+    def __init__(self, index, slot):
+        object.__setattr__(self, "index", index)
+        object.__setattr__(self, "slot", slot)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("MoveEnd is read-only")
+
+    def __repr__(self):
+        return f"MoveEnd(index={self.index}, slot={self.slot})"
+
 class Move:
-    def __init__(self, start_point:Point, final_point:Point, die, hit=False):
-        self.start_point = start_point
-        self.final_point = final_point
-        self.hit = hit
-        self.die = die
-    
+    __slots__ = ("player", "start_index", "final_index", "start_slot", "final_slot", "die", "hit", "id", "bit")
+
+    def __init__(self, player:Player, start_index, final_index, final_slot, die, hit, id):
+        set_attr = object.__setattr__
+        set_attr(self, "player", player)
+        set_attr(self, "start_index", start_index)
+        set_attr(self, "final_index", final_index)
+        # Starts are always a point or a bar, whose slot is their index
+        set_attr(self, "start_slot", start_index)
+        set_attr(self, "final_slot", final_slot)
+        set_attr(self, "die", die)
+        set_attr(self, "hit", hit)
+        # Position in MOVES and the matching bit of the engine's legal move mask
+        set_attr(self, "id", id)
+        set_attr(self, "bit", 1 << id)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Move is immutable")
+
+    def __reduce__(self):
+        return (_interned_move, (self.id,))
+
+    def __copy__(self):
+        return self
+
     def __deepcopy__(self, memo):
-        # Usually not used by engine deepcopy; provided for safety
-        cls = self.__class__
-        new_obj = cls.__new__(cls)
-        memo[id(self)] = new_obj
-        # Keep references (do NOT deepcopy points here)
-        new_obj.start_point = self.start_point
-        new_obj.final_point = self.final_point
-        new_obj.hit = self.hit
-        new_obj.die = self.die
-        return new_obj
+        return self
+
+    def __repr__(self):
+        hit = " hit" if self.hit else ""
+        return f"Move({self.player.name} {self.start_index}->{self.final_index} die={self.die}{hit})"
 
     def get_player(self) -> Player:
-        return self.start_point.owner
+        return self.player
+
+    # Compatibility with code written when moves held board views, see MoveEnd
+    @property
+    def start_point(self) -> MoveEnd:
+        warnings.warn("Move.start_point is deprecated, use start_index and start_slot "
+                      "(board.views[move.start_slot] for the view)", DeprecationWarning, stacklevel=2)
+        return MoveEnd(self.start_index, self.start_slot)
+
+    @property
+    def final_point(self) -> MoveEnd:
+        warnings.warn("Move.final_point is deprecated, use final_index and final_slot "
+                      "(board.views[move.final_slot] for the view)", DeprecationWarning, stacklevel=2)
+        return MoveEnd(self.final_index, self.final_slot)
+
+# Builds every possible move of both players.
+# MOVE_TABLE[player][start_slot][die] is a (move, hitting move) pair, None where no move exists.
+# Bearing off has no hitting version
+def _build_move_table():
+    moves = []
+    table = {}
+
+    def intern(player, start_index, final_index, final_slot, die, hit):
+        move = Move(player, start_index, final_index, final_slot, die, hit, len(moves))
+        moves.append(move)
+        return move
+
+    for player in (Player.WHITE, Player.BLACK):
+        sign = player.value
+        if sign > 0:
+            bar_slot, home_slot, home_index = WHITE_BAR, WHITE_HOME, 25
+        else:
+            bar_slot, home_slot, home_index = BLACK_BAR, BLACK_HOME, 0
+
+        by_start = [[None] * 7 for _ in range(BLACK_BAR + 1)]
+        for start in [bar_slot] + list(range(1, 25)):
+            for die in range(1, 7):
+                final = start + die * sign
+                if 0 < final < 25:
+                    by_start[start][die] = (intern(player, start, final, final, die, False),
+                                            intern(player, start, final, final, die, True))
+                elif start != bar_slot:
+                    by_start[start][die] = (intern(player, start, home_index, home_slot, die, False), None)
+        table[player] = by_start
+    return tuple(moves), table
+
+MOVES, MOVE_TABLE = _build_move_table()
+
+def _interned_move(id) -> Move:
+    return MOVES[id]
+
+# A complete turn: the moves to play in order and the board cells they lead to
+class Play:
+    __slots__ = ("moves", "position")
+
+    def __init__(self, moves:tuple, position:bytes):
+        self.moves = moves
+        self.position = position
+
+    def __repr__(self):
+        return f"Play({self.moves})"
+
+# Maximum number of (position, dice) entries kept by generate_plays
+PLAY_CACHE_SIZE = 4096
+
+# The 21 distinct rolls as (dice values, probability). A double gives four dice
+ROLLS = tuple(
+    ((die1,) * 4, 1 / 36) if die1 == die2 else ((die1, die2), 2 / 36)
+    for die1 in range(1, 7)
+    for die2 in range(1, die1 + 1)
+)
 
 # Class contains engine
 class BackgammonEngine:
-    def __init__(self):
+    __slots__ = ("board", "dice", "turn", "winner", "rolls", "lazy", "_legal_moves", "_legal_mask", "_undo_stack")
+
+    # rng and dice_sequence are handed to Dice to control the rolls of this engine.
+    # A lazy engine only works out legal_moves when they are first read; after each roll and die it
+    # just checks that some move exists, stopping at the first one
+    def __init__(self, rng=None, dice_sequence=None, lazy=False):
         # Board class
         self.board = Board()
 
         # Game state data
-        self.dice = Dice()
+        self.dice = Dice(rng=rng, sequence=dice_sequence)
         self.turn = Player.WHITE
         self.winner = None
-        self.legal_moves: list[Move] = []
+        self.lazy = lazy
+
+        # Legal moves of the player to move, None while a lazy engine has not worked them out
+        self._legal_moves: list[Move] = []
+
+        # Rolls made this game, including those passed for lack of a legal move
+        self.rolls = 0
+
+        # Move.bit of every legal move, for O(1) legality checks
+        self._legal_mask = 0
+
+        # One record per apply() that undo() has not reversed yet
+        self._undo_stack = []
 
     def __deepcopy__(self, memo):
         cls = self.__class__
@@ -255,17 +680,118 @@ class BackgammonEngine:
         # Enums (Player) are immutable/safe to reuse
         new_obj.turn = self.turn
         new_obj.winner = self.winner
+        new_obj.rolls = self.rolls
+        new_obj.lazy = self.lazy
 
         # Never copy old legal moves; rebuild for the new board/dice state
-        new_obj.legal_moves = []
-        new_obj.generate_legal_moves()
+        new_obj._legal_moves = []
+        new_obj._legal_mask = 0
+        new_obj._undo_stack = []
+        if new_obj.lazy:
+            new_obj._legal_moves = None
+        else:
+            new_obj.generate_legal_moves()
         return new_obj
 
+    # The legal single die moves of the player to move. A lazy engine generates them here on first use
+    @property
+    def legal_moves(self) -> list:
+        legal_moves = self._legal_moves
+        if legal_moves is None:
+            self.generate_legal_moves()
+            legal_moves = self._legal_moves
+        return legal_moves
+
+    @legal_moves.setter
+    def legal_moves(self, legal_moves):
+        self._legal_moves = legal_moves
+
+    # 64-bit Zobrist hash of the position, the player to move and the dice left.
+    # The board part is kept up to date as stones move, the rest is at most 5 lookups
+    @property
+    def position_hash(self) -> int:
+        value = self.board.zobrist
+        if self.turn == Player.WHITE:
+            value ^= _ZOBRIST_WHITE_TO_MOVE
+
+        values = self.dice.values
+        for die in set(values):
+            value ^= _ZOBRIST_DICE[die][values.count(die)]
+        return value
+
+    # 12-byte ID of the game state: the board's position ID, then a byte with the player to move
+    # (0 none, 1 white, 2 black) in the low and the number of dice left in the high nibble,
+    # then a byte with the first die left in the low and the second in the high nibble
+    def position_id(self) -> bytes:
+        values = self.dice.values
+        turn = 0 if self.turn is None else (1 if self.turn == Player.WHITE else 2)
+        first = values[0] if len(values) > 0 else 0
+        second = values[1] if len(values) > 1 else 0
+        return self.board.position_id() + bytes((turn | len(values) << 4, first | second << 4))
+
+    # Restores the state position_id() describes, with its legal moves and an empty undo history
+    def load_position_id(self, position_id:bytes):
+        if len(position_id) != ENGINE_ID_SIZE:
+            raise ValueError(f"Engine position ID must be {ENGINE_ID_SIZE} bytes")
+
+        state, dice = position_id[POSITION_ID_SIZE], position_id[POSITION_ID_SIZE + 1]
+        count = state >> 4
+        # The dice left: none with both nibbles 0, one with the second nibble 0, two different dice,
+        # or two to four of a double
+        first, second = dice & 15, dice >> 4
+        if count == 0:
+            valid_dice = dice == 0
+        elif count == 1:
+            valid_dice = 1 <= first <= 6 and second == 0
+        else:
+            valid_dice = 1 <= first <= 6 and 1 <= second <= 6 and count <= (4 if first == second else 2)
+        if state & 15 > 2 or not valid_dice:
+            raise ValueError("Invalid engine position ID")
+
+        self.board.load_position_id(position_id[:POSITION_ID_SIZE])
+        self.turn = (None, Player.WHITE, Player.BLACK)[state & 15]
+        self.dice.values[:] = [first] * count if first == second else [first, second][:count]
+
+        cells = self.board.cells
+        if cells[WHITE_HOME] == 15:
+            self.winner = Player.WHITE
+        elif cells[BLACK_HOME] == -15:
+            self.winner = Player.BLACK
+        else:
+            self.winner = None
+
+        self._undo_stack.clear()
+        if self.turn is None or self.winner is not None:
+            self._legal_moves = []
+            self._legal_mask = 0
+        else:
+            self._update_legal_moves()
+
+    # White's result once the game is won: 1 for a single game, 2 for a gammon (the loser has borne
+    # nothing off), 3 for a backgammon (a gammon with a loser's stone on the bar or in the winner's
+    # home board), negative when Black wins. 0 while the game is still going
+    def game_value(self) -> int:
+        cells = self.board.cells
+        if self.winner == Player.WHITE:
+            if cells[BLACK_HOME] != 0:
+                return 1
+            trapped = cells[BLACK_BAR] < 0 or any(cells[slot] < 0 for slot in range(19, 25))
+            return 3 if trapped else 2
+
+        if self.winner == Player.BLACK:
+            if cells[WHITE_HOME] != 0:
+                return -1
+            trapped = cells[WHITE_BAR] > 0 or any(cells[slot] > 0 for slot in range(1, 7))
+            return -3 if trapped else -2
+        return 0
+
     def start(self):
         # Reinitialize board object
         self.board.setup()
         self.turn = None
         self.winner = None
+        self.rolls = 0
+        self._undo_stack.clear()
         self.next_turn()
        
     def next_turn(self, roll=True):
@@ -278,103 +804,232 @@ class BackgammonEngine:
             self.turn = Player.WHITE
 
         if roll == True:
-            self.dice.roll()
-            self.generate_legal_moves()
-            if len(self.legal_moves) == 0:
-                self.next_turn()
+            self.roll()
+
+    # Rolls the dice for the player whose turn it is, passing the turn if they can't move
+    def roll(self):
+        self.dice.roll()
+        self.rolls += 1
+        if not self._update_legal_moves():
+            self.next_turn()
+
+    # Brings the legal moves up to date after the position or dice changed: generates them, or in a lazy
+    # engine marks them stale. Returns whether the player to move has any legal move
+    def _update_legal_moves(self) -> bool:
+        if self.lazy:
+            self._legal_moves = None
+            self._legal_mask = 0
+            return self.has_legal_move()
+        self.generate_legal_moves()
+        return len(self._legal_moves) > 0
+
+    # Whether the player to move has a legal move, stopping at the first one found
+    def has_legal_move(self) -> bool:
+        if self._legal_moves is not None:
+            return len(self._legal_moves) > 0
+        return next(self.iter_legal_moves(), None) is not None
+
+    # The legal moves one at a time, in legal_moves order, without building the list when it is
+    # not already known. The position must not change while iterating
+    def iter_legal_moves(self):
+        if self._legal_moves is not None:
+            yield from self._legal_moves
+            return
+
+        board = self.board
+        cells = board.cells
+        sign = self.turn.value
+        table = MOVE_TABLE[self.turn]
+        dice = list(dict.fromkeys(self.dice.values))
+        if sign > 0:
+            bar_slot, home_index = WHITE_BAR, 25
+        else:
+            bar_slot, home_index = BLACK_BAR, 0
+
+        # The same cases as generate_legal_moves
+        if cells[bar_slot] == 0:
+            furthest = board.rear_white if sign > 0 else board.rear_black
+            all_home = furthest > 18 if sign > 0 else furthest < 7
+
+            for index in range(1, 25):
+                if cells[index] * sign <= 0:
+                    continue
+
+                moves = table[index]
+                for die in dice:
+                    final_index = index + die * sign
+                    if 0 < final_index < 25:
+                        final_value = cells[final_index] * sign
+                        if final_value >= 0:
+                            yield moves[die][0]
+                        elif final_value == -1:
+                            yield moves[die][1]
+                    elif all_home and (final_index == home_index or index == furthest):
+                        yield moves[die][0]
+        else:
+            moves = table[bar_slot]
+            for die in dice:
+                final_value = cells[bar_slot + die * sign] * sign
+                if final_value >= 0:
+                    yield moves[die][0]
+                elif final_value == -1:
+                    yield moves[die][1]
 
     def generate_legal_moves(self):
-        self.legal_moves.clear()
+        # Always build a new list so callers iterating the old one are not disturbed
+        legal_moves = []
+        self._legal_moves = legal_moves
+        mask = 0
+        board = self.board
+        cells = board.cells
+        sign = self.turn.value
+        table = MOVE_TABLE[self.turn]
+
+        # Each distinct die value only needs to be tried once
+        dice = list(dict.fromkeys(self.dice.values))
+
         # Get the home and bar of the player's turn
-        home = self.board.home_white if self.turn == Player.WHITE else self.board.home_black
-        bar = self.board.bar_white if self.turn == Player.WHITE else self.board.bar_black
+        if sign > 0:
+            bar_slot, home_index = WHITE_BAR, 25
+        else:
+            bar_slot, home_index = BLACK_BAR, 0
 
         # Loop through the points if bar is empty
-        if bar.count == 0:
-            for point in self.board.points:
+        if cells[bar_slot] == 0:
+            furthest = board.rear_white if sign > 0 else board.rear_black
+            all_home = furthest > 18 if sign > 0 else furthest < 7
+
+            for index in range(1, 25):
                 # Check if point owner is the same as the turn owner
-                if point.owner == self.turn:
-                    # Loop through die
-                    for die in self.dice.values:
-                        final_point_index = point.index + (die * self.turn.value)
-
-                        # Case 1 - point to point
-                        if final_point_index < 25 and final_point_index > 0:
-                            final_point = self.board.get_point(final_point_index)
-
-                            # Case 1a - empty or same player
-                            if final_point.owner == None or final_point.owner == self.turn:
-                                self.legal_moves.append(Move(start_point=point, final_point=final_point, die=die))
-                                continue
-
-                            # Case 1b - opponent point (hit)
-                            if final_point.owner != None and final_point.owner != self.turn and final_point.count == 1:
-                                self.legal_moves.append(Move(start_point=point, final_point=final_point, die=die, hit=True))
-                                continue
-
-                        # Case 2 - Point to home
-                        if self.board.are_all_player_stones_home(self.turn):
-                            # Case 2a - Bearing off directly into home
-                            if final_point_index == home.index:
-                                self.legal_moves.append(Move(start_point=point, final_point=home, die=die))
-
-                            # Case 2b - Bearing off with an overshoot
-                            if point.index == self.board.get_point_furthest_from_home(self.turn).index:
-                                if (final_point_index - home.index) * self.turn.value > 0:
-                                    self.legal_moves.append(Move(start_point=point, final_point=home, die=die))
-                                    continue
+                if cells[index] * sign <= 0:
+                    continue
+
+                # Loop through die
+                moves = table[index]
+                for die in dice:
+                    final_index = index + die * sign
+
+                    # Case 1 - point to point
+                    if 0 < final_index < 25:
+                        final_value = cells[final_index] * sign
+
+                        # Case 1a - empty or same player
+                        if final_value >= 0:
+                            move = moves[die][0]
+
+                        # Case 1b - opponent point (hit)
+                        elif final_value == -1:
+                            move = moves[die][1]
+                        else:
+                            continue
+
+                    # Case 2 - Point to home, either directly or with an overshoot from the furthest point
+                    elif all_home and (final_index == home_index or index == furthest):
+                        move = moves[die][0]
+                    else:
+                        continue
+
+                    legal_moves.append(move)
+                    mask |= move.bit
+
         # Case 3 - Bar to points
-        elif bar.count > 0:
-            for die in self.dice.values:
-                final_point_index = bar.index + (die * self.turn.value)
-                final_point = self.board.get_point(final_point_index)
-            
+        else:
+            moves = table[bar_slot]
+            for die in dice:
+                final_value = cells[bar_slot + die * sign] * sign
+
                 # Case 3a - Empty or same player
-                if final_point.owner == None or final_point.owner == self.turn:
-                    self.legal_moves.append(Move(start_point=bar, final_point=final_point, die=die))
-                    continue
+                if final_value >= 0:
+                    move = moves[die][0]
 
                 # Case 3b - Opponent player (hit)
-                if final_point.owner != None and final_point.owner != self.turn and final_point.count == 1:
-                    self.legal_moves.append(Move(start_point=bar, final_point=final_point, die=die, hit=True))
+                elif final_value == -1:
+                    move = moves[die][1]
+                else:
                     continue
 
+                legal_moves.append(move)
+                mask |= move.bit
+
+        self._legal_mask = mask
+
     def make_move(self, move: Move):
-        # Check if move exists in legal_moves list
-        if any(legal_move is move for legal_move in self.legal_moves) == False:
+        self._check_move(move)
+
+        # Moves made for real can't be undone, so drop anything still on the stack
+        self._undo_stack.clear()
+        self._play(move)
+
+        # Roll for the next player once the turn has passed
+        if len(self.dice.values) == 0 and self.winner == None:
+            self.roll()
+
+    # Plays move in place without rolling for the next turn.
+    # Every apply must be reversed by a matching undo, most recent first
+    def apply(self, move: Move):
+        self._check_move(move)
+        self._undo_stack.append(self._play(move))
+
+    # Restores the exact state from before the last apply
+    def undo(self):
+        if len(self._undo_stack) == 0:
+            raise ValueError("Nothing to undo")
+        move, die_index, turn, winner, legal_moves, legal_mask, dice = self._undo_stack.pop()
+
+        # Restore game state data
+        if dice is not None:
+            self.dice.values = dice
+        self.dice.values.insert(die_index, move.die)
+        self.turn = turn
+        self.winner = winner
+        self._legal_moves = legal_moves
+        self._legal_mask = legal_mask
+
+        # Put the stone back, returning a hit stone from the enemy bar
+        self.board.unmove_stone(move.start_slot, move.final_slot, turn.value, move.hit)
+
+    def _check_move(self, move: Move):
+        # Check if move is one of legal_moves
+        if self._legal_moves is None:
+            self.generate_legal_moves()
+        if self._legal_mask & move.bit == 0:
             raise ValueError("Move not found in legal_moves")
         
         if self.winner != None:
             raise ValueError("Already a winner")
 
-        # Decrement start point count
-        move.start_point.remove_stone()
-
-        # Add stone to end point
-        move.final_point.add_stone(self.turn)
+    # Moves the stone and uses up the die. When the turn is over the turn is swapped
+    # and the dice are left empty. Returns the record undo needs to reverse it
+    def _play(self, move: Move):
+        turn = self.turn
+        winner = self.winner
+        legal_moves = self._legal_moves
+        legal_mask = self._legal_mask
 
-        # If hit, add stone to enemy bar
-        if move.hit == True:
-            if self.turn == Player.WHITE:
-                self.board.bar_black.count += 1
-            else:
-                self.board.bar_white.count += 1
+        # Move the stone from the start point to the end point. On a hit the lone enemy stone goes to its bar
+        self.board.move_stone(move.start_slot, move.final_slot, turn.value, move.hit)
 
         # Check for win
-        if self.turn == Player.WHITE and self.board.get_point_furthest_from_home(Player.WHITE).index == 25:
+        if turn == Player.WHITE and self.board.rear_white == 25:
             self.winner = Player.WHITE
-        elif self.turn == Player.BLACK and self.board.get_point_furthest_from_home(Player.BLACK).index == 0:
+        elif turn == Player.BLACK and self.board.rear_black == 0:
             self.winner = Player.BLACK
 
         # Remove die used for move
-        self.dice.remove_die(move.die)
+        die_index = self.dice.values.index(move.die)
+        del self.dice.values[die_index]
 
-        if len(self.dice.values) == 0:
-            self.next_turn()
-        else:
-            self.generate_legal_moves()
-            if len(self.legal_moves) == 0:
-                self.next_turn()
+        # The turn is over once there is a winner, the dice are used up or nothing can move
+        if self.winner == None and len(self.dice.values) > 0:
+            if self._update_legal_moves():
+                return (move, die_index, turn, winner, legal_moves, legal_mask, None)
+
+        dice = self.dice.values
+        self.dice.values = []
+        self._legal_moves = []
+        self._legal_mask = 0
+        self.next_turn(roll=False)
+        return (move, die_index, turn, winner, legal_moves, legal_mask, dice)
 
     # Attempts to make move based on provided start and end index
     # Returns True if successful and False otherwise
@@ -383,12 +1038,37 @@ class BackgammonEngine:
         if self.winner != None:
             return False
 
-        # Search if move exists within the legal_moves list
-        for move in self.legal_moves:
-            if move.start_point.index == start_index and move.final_point.index == end_index:
-                self.make_move(move=move)
-                return True
-        return False
+        move = self.find_move(start_index, end_index)
+        if move is None:
+            return False
+        self.make_move(move=move)
+        return True
+
+    # Returns the legal move matching the start and end index (and die if given), or None.
+    # Without a die the dice are tried in the same order legal_moves lists them
+    def find_move(self, start_index, end_index, die=None) -> Move:
+        if self.turn is None or start_index < 0 or start_index > BLACK_BAR:
+            return None
+        if self._legal_moves is None:
+            self.generate_legal_moves()
+
+        moves = MOVE_TABLE[self.turn][start_index]
+        for value in (dict.fromkeys(self.dice.values) if die is None else (die,)):
+            if value < 1 or value > 6 or moves[value] is None:
+                continue
+            for move in moves[value]:
+                if move is not None and move.final_index == end_index and self._legal_mask & move.bit:
+                    return move
+        return None
+
+    # Returns every complete turn for the player to move, one Play per distinct resulting position.
+    # Plays must use as many dice as possible and, when only one of two dice can be used, the larger one.
+    # dice defaults to the dice left this turn. If nothing can move the only play is the empty one
+    def generate_plays(self, dice=None) -> tuple:
+        if dice is None:
+            dice = self.dice.values
+        return generate_plays(self.board.cells.tobytes(), self.turn, dice)
+
     
 
     def swap_player_value(self, player: Player) -> Player:
@@ -532,3 +1212,57 @@ class BackgammonEngine:
         lines.append(winner_text.center(len(border), "="))
 
         return "\n".join(lines)
+
+
+# BackgammonEngine.generate_plays for a position given as board cell bytes,
+# for searches that keep positions rather than engines
+def generate_plays(position:bytes, turn:Player, dice) -> tuple:
+    return _generate_plays(position, turn, tuple(sorted(dice, reverse=True)))
+
+# Plays depend only on the position, the player to move and the dice,
+# so they are shared between engines through a bounded LRU cache
+@lru_cache(maxsize=PLAY_CACHE_SIZE)
+def _generate_plays(position:bytes, turn:Player, dice:tuple) -> tuple:
+    engine = BackgammonEngine()
+    engine.board.load(position)
+    engine.turn = turn
+    engine.dice.values = list(dice)
+    engine.generate_legal_moves()
+    if len(engine.legal_moves) == 0:
+        return (Play(moves=(), position=position),)
+
+    # Resulting position -> (dice used, steps). A win counts as using every die
+    found = {}
+    _extend_plays(engine, (), set(), found, len(dice))
+
+    most_used = max(used for used, _ in found.values())
+    plays = [(steps, key) for key, (used, steps) in found.items() if used == most_used]
+
+    # Only one of two different dice can be played: it has to be the larger one if possible
+    if most_used == 1 and len(dice) == 2 and dice[0] != dice[1]:
+        larger = [(steps, key) for steps, key in plays if steps[0].die == dice[0]]
+        if len(larger) > 0:
+            plays = larger
+
+    return tuple(Play(moves=steps, position=key) for steps, key in plays)
+
+# Depth first search over single die moves with apply/undo.
+# seen holds (position, dice left) states already expanded so transpositions are only searched once
+def _extend_plays(engine, steps, seen, found, dice_count):
+    turn = engine.turn
+    for move in engine.legal_moves:
+        engine.apply(move)
+        path = steps + (move,)
+
+        if engine.turn != turn:
+            key = engine.board.cells.tobytes()
+            used = dice_count if engine.winner != None else len(path)
+            if key not in found or found[key][0] < used:
+                found[key] = (used, path)
+        else:
+            state = (engine.board.cells.tobytes(), len(engine.dice.values))
+            if state not in seen:
+                seen.add(state)
+                _extend_plays(engine, path, seen, found, dice_count)
+
+        engine.undo()
@@ -0,0 +1,147 @@
+"""
+Neural-network position evaluation in NumPy.
+
+Positions are encoded with TD-Gammon's 198 inputs and fed to a one-hidden-layer
+perceptron with sigmoid units, giving White's chances from the position:
+(win, win a gammon, lose a gammon). Many positions are evaluated in one
+forward pass; the input and hidden buffers are kept and reused between calls.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from backgammon.engine import BLACK_BAR, BLACK_HOME, NUM_SLOTS, WHITE_BAR, WHITE_HOME, Player
+
+# 4 units per point and side, then bar and borne off per side, then the side to roll
+INPUTS = 198
+OUTPUTS = 3
+WIN, WIN_GAMMON, LOSE_GAMMON = range(OUTPUTS)
+
+_WHITE_UNITS = 0
+_BLACK_UNITS = 96
+_BARS = 192
+_HOMES = 194
+_TURN = 196
+
+
+# Writes the inputs of positions (an (N, 28) int8 array of board cells) with turn to roll
+# into the first N rows of out, allocating out when it is None. Returns those rows.
+# Each point gives a side 4 units: at least 1, 2 and 3 stones, and (count - 3) / 2 beyond that
+def encode(positions, turn: Player, out=None):
+    positions = np.asarray(positions, dtype=np.int8).reshape(-1, NUM_SLOTS)
+    count = len(positions)
+    if out is None:
+        out = np.empty((count, INPUTS), dtype=np.float32)
+    inputs = out[:count]
+
+    points = positions[:, 1:25]
+    for first, stones in ((_WHITE_UNITS, np.maximum(points, 0)), (_BLACK_UNITS, np.maximum(-points, 0))):
+        for unit in range(3):
+            inputs[:, first + unit:first + 96:4] = stones > unit
+        inputs[:, first + 3:first + 96:4] = np.maximum(stones - 3, 0) / 2
+
+    inputs[:, _BARS] = positions[:, WHITE_BAR] / 2
+    inputs[:, _BARS + 1] = positions[:, BLACK_BAR] / -2
+    inputs[:, _HOMES] = positions[:, WHITE_HOME] / 15
+    inputs[:, _HOMES + 1] = positions[:, BLACK_HOME] / -15
+    inputs[:, _TURN] = turn == Player.WHITE
+    inputs[:, _TURN + 1] = turn == Player.BLACK
+    return inputs
+
+# White's cubeless equity from network outputs: +-1 for a game, +-2 for a gammon
+def equity(outputs):
+    return 2 * outputs[..., WIN] - 1 + outputs[..., WIN_GAMMON] - outputs[..., LOSE_GAMMON]
+
+
+class Network:
+    """
+    A 198-`hidden`-3 perceptron with sigmoid units. Without weights it starts
+    from small random ones drawn from `seed`; trained weights come from
+    Network.load().
+    """
+
+    def __init__(self, hidden=80, seed=None):
+        if np is None:
+            raise ImportError("Network requires numpy")
+
+        rng = np.random.default_rng(seed)
+        self.w1 = rng.normal(0.0, INPUTS ** -0.5, (INPUTS, hidden)).astype(np.float32)
+        self.b1 = np.zeros(hidden, dtype=np.float32)
+        self.w2 = rng.normal(0.0, hidden ** -0.5, (hidden, OUTPUTS)).astype(np.float32)
+        self.b2 = np.zeros(OUTPUTS, dtype=np.float32)
+
+        self._inputs = np.empty((0, INPUTS), dtype=np.float32)
+        self._hidden = np.empty((0, hidden), dtype=np.float32)
+
+    @classmethod
+    def load(cls, path) -> "Network":
+        """Network with the w1, b1, w2 and b2 arrays of an .npz file."""
+
+        with np.load(path) as weights:
+            w1, b1, w2, b2 = (weights[name].astype(np.float32) for name in ("w1", "b1", "w2", "b2"))
+        hidden = w1.shape[1]
+        if w1.shape != (INPUTS, hidden) or b1.shape != (hidden,) or w2.shape != (hidden, OUTPUTS) \
+                or b2.shape != (OUTPUTS,):
+            raise ValueError(f"{path} does not hold {INPUTS}-hidden-{OUTPUTS} network weights")
+
+        network = cls(hidden=hidden)
+        network.w1, network.b1, network.w2, network.b2 = w1, b1, w2, b2
+        return network
+
+    def save(self, path):
+        np.savez(path, w1=self.w1, b1=self.b1, w2=self.w2, b2=self.b2)
+
+    def __getstate__(self):
+        # The scratch buffers are rebuilt on demand
+        state = self.__dict__.copy()
+        state["_inputs"] = np.empty((0, INPUTS), dtype=np.float32)
+        state["_hidden"] = np.empty((0, self.w1.shape[1]), dtype=np.float32)
+        return state
+
+    def forward(self, inputs):
+        """(N, 3) outputs for (N, 198) inputs."""
+
+        count = len(inputs)
+        hidden = self._buffers(count)[1]
+        np.matmul(inputs, self.w1, out=hidden)
+        hidden += self.b1
+        _sigmoid(hidden)
+        outputs = hidden @ self.w2
+        outputs += self.b2
+        return _sigmoid(outputs)
+
+    def evaluate(self, positions, turn: Player):
+        """
+        (N, 3) outputs for an (N, 28) array of board cells with `turn` to
+        roll. Finished games get their exact outcome instead.
+        """
+
+        positions = np.asarray(positions, dtype=np.int8).reshape(-1, NUM_SLOTS)
+        outputs = self.forward(encode(positions, turn, self._buffers(len(positions))[0]))
+
+        white_off = positions[:, WHITE_HOME] == 15
+        black_off = positions[:, BLACK_HOME] == -15
+        outputs[white_off] = (1.0, 0.0, 0.0)
+        outputs[white_off, WIN_GAMMON] = positions[white_off, BLACK_HOME] == 0
+        outputs[black_off] = (0.0, 0.0, 0.0)
+        outputs[black_off, LOSE_GAMMON] = positions[black_off, WHITE_HOME] == 0
+        return outputs
+
+    def _buffers(self, count):
+        # Grow the scratch buffers geometrically so steady batch sizes stop allocating
+        if len(self._inputs) < count:
+            size = max(count, 2 * len(self._inputs))
+            self._inputs = np.empty((size, INPUTS), dtype=np.float32)
+            self._hidden = np.empty((size, self.w1.shape[1]), dtype=np.float32)
+        return self._inputs[:count], self._hidden[:count]
+
+def _sigmoid(values):
+    # In place, clipped so large inputs do not overflow exp
+    np.clip(values, -60.0, 60.0, out=values)
+    np.negative(values, out=values)
+    np.exp(values, out=values)
+    values += 1.0
+    np.reciprocal(values, out=values)
+    return values
@@ -0,0 +1,53 @@
+"""
+Bulk position IDs.
+
+encode_positions() and decode_positions() convert whole arrays of boards to
+and from the 10-byte IDs of Board.position_id() / Board.load_position_id()
+in a few vectorised NumPy passes.
+"""
+
+import numpy as np
+
+from backgammon.engine import _BLACK_ID_SLOTS, _WHITE_ID_SLOTS, BLACK_HOME, NUM_SLOTS, POSITION_ID_SIZE, WHITE_HOME
+
+_BITS = POSITION_ID_SIZE * 8
+_RUNS = len(_WHITE_ID_SLOTS) + len(_BLACK_ID_SLOTS)
+
+
+# (N, 10) uint8 position IDs of an (N, 28) array of board cells
+def encode_positions(positions):
+    positions = np.asarray(positions, dtype=np.int8).reshape(-1, NUM_SLOTS)
+    counts = np.concatenate((np.maximum(positions[:, _WHITE_ID_SLOTS], 0),
+                             np.maximum(-positions[:, _BLACK_ID_SLOTS], 0)), axis=1).astype(np.intp)
+
+    # Each slot is a run of 1 bits closed by a 0 bit; everything after the last run is 0
+    closing = np.cumsum(counts + 1, axis=1) - 1
+    bits = np.arange(_BITS) <= closing[:, -1:]
+    bits[np.arange(len(positions))[:, None], closing] = False
+    return np.packbits(bits, axis=1, bitorder="little")
+
+# (N, 28) int8 board cells of an (N, 10) array of position IDs
+def decode_positions(position_ids):
+    position_ids = np.asarray(position_ids, dtype=np.uint8).reshape(-1, POSITION_ID_SIZE)
+    count = len(position_ids)
+    bits = np.unpackbits(position_ids, axis=1, bitorder="little").astype(bool)
+
+    # A 1 bit belongs to the slot numbered by the 0 bits before it
+    rows, columns = np.nonzero(bits)
+    runs = np.cumsum(~bits, axis=1)[rows, columns]
+    if len(runs) and runs.max() >= _RUNS:
+        raise ValueError("Invalid position ID")
+    counts = np.bincount(rows * _RUNS + runs, minlength=count * _RUNS).reshape(count, _RUNS)
+
+    white, black = counts[:, :len(_WHITE_ID_SLOTS)], counts[:, len(_WHITE_ID_SLOTS):]
+    if (white.sum(axis=1) > 15).any() or (black.sum(axis=1) > 15).any():
+        raise ValueError("Invalid position ID")
+
+    positions = np.zeros((count, NUM_SLOTS), dtype=np.int8)
+    positions[:, _WHITE_ID_SLOTS] = white
+    if ((positions[:, _BLACK_ID_SLOTS] > 0) & (black > 0)).any():
+        raise ValueError("Invalid position ID")
+    positions[:, _BLACK_ID_SLOTS] -= black.astype(np.int8)
+    positions[:, WHITE_HOME] = 15 - white.sum(axis=1)
+    positions[:, BLACK_HOME] = black.sum(axis=1) - 15
+    return positions
@@ -0,0 +1,223 @@
+"""
+Self-play data generation.
+
+generate() plays games through BackgammonArbiter and records one fixed-width
+RECORD per turn: the board before the turn, the side to roll, the dice, the
+ids of the moves played (Move.id, -1 when fewer than four) and White's final
+result (BackgammonEngine.game_value()). Finished games are handed through a
+bounded queue to a writer thread that streams them into a sink:
+
+- ShardWriter fills fixed-size memory-mapped shard files in a directory,
+  read back without copies by read_shards() / iter_records()
+- ReplayBuffer keeps the latest `capacity` records in a ring for online
+  training, sampled with ReplayBuffer.sample().
+
+Boards are stored as the raw 28 cells; backgammon.network.encode() turns a
+batch of them into network inputs.
+"""
+
+import glob
+import os
+import queue
+import random
+import re
+import threading
+
+import numpy as np
+
+from backgammon.arbiter import ArbiterResults, BackgammonArbiter, seeded_engine
+from backgammon.bots import BackgammonBot
+from backgammon.engine import NUM_SLOTS
+
+RECORD = np.dtype([
+    ("board", "i1", (NUM_SLOTS,)),
+    ("turn", "i1"),
+    ("dice", "u1", (2,)),
+    ("play", "<i2", (4,)),
+    ("outcome", "i1"),
+    ("game", "<u4"),
+])
+
+_SHARD_NAME = re.compile(r"shard-(\d+)\.rec(\.tmp)?$")
+
+class ShardWriter:
+    """
+    Writes records into shard-NNNNN.rec files of `records_per_shard` records
+    each. A shard is filled as shard-NNNNN.rec.tmp and only renamed once it
+    is closed and cut to the records written, so readers never see a shard
+    left half-written by a run that did not finish.
+    """
+
+    def __init__(self, directory, records_per_shard=1 << 20):
+        self.directory = directory
+        self.records_per_shard = records_per_shard
+        os.makedirs(directory, exist_ok=True)
+
+        # Continue after the highest numbered shard already in the directory, finished or not
+        numbers = [int(match.group(1)) for match in map(_SHARD_NAME.match, os.listdir(directory)) if match]
+        self._next_shard = max(numbers, default=-1) + 1
+        self._shard = None
+        self._path = None
+        self._filled = 0
+
+    def write(self, records):
+        while len(records) > 0:
+            if self._shard is None:
+                self._path = os.path.join(self.directory, f"shard-{self._next_shard:05d}.rec")
+                self._shard = np.memmap(self._path + ".tmp", dtype=RECORD, mode="w+", shape=(self.records_per_shard,))
+                self._next_shard += 1
+                self._filled = 0
+
+            count = min(len(records), self.records_per_shard - self._filled)
+            self._shard[self._filled:self._filled + count] = records[:count]
+            self._filled += count
+            records = records[count:]
+            if self._filled == self.records_per_shard:
+                self._close_shard()
+
+    def close(self):
+        if self._shard is not None:
+            self._close_shard()
+
+    def _close_shard(self):
+        self._shard.flush()
+        self._shard = None
+
+        # A last, partly filled shard is cut down to the records written
+        if self._filled < self.records_per_shard:
+            os.truncate(self._path + ".tmp", self._filled * RECORD.itemsize)
+        os.replace(self._path + ".tmp", self._path)
+
+
+class ReplayBuffer:
+    """
+    The latest `capacity` records in a ring, overwriting the oldest first.
+    Backed by a memory-mapped file when `path` is given, by memory otherwise.
+    """
+
+    def __init__(self, capacity, path=None):
+        self.capacity = capacity
+        if path is None:
+            self.records = np.zeros(capacity, dtype=RECORD)
+        else:
+            self.records = np.memmap(path, dtype=RECORD, mode="w+", shape=(capacity,))
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def write(self, records):
+        # Only the last capacity records of an oversized batch would survive
+        records = records[-self.capacity:]
+        with self._lock:
+            first = self._next
+            count = min(len(records), self.capacity - first)
+            self.records[first:first + count] = records[:count]
+            self.records[:len(records) - count] = records[count:]
+            self._next = (first + len(records)) % self.capacity
+            self._size = min(self.capacity, self._size + len(records))
+
+    def sample(self, count, rng=None):
+        """A copy of `count` records drawn uniformly, with replacement, from those held."""
+
+        rng = np.random.default_rng() if rng is None else rng
+        with self._lock:
+            if self._size == 0:
+                raise ValueError("Cannot sample from an empty replay buffer")
+            return self.records[rng.integers(0, self._size, size=count)]
+
+    def close(self):
+        if isinstance(self.records, np.memmap):
+            self.records.flush()
+
+
+# Records one game's turns as the arbiter makes each move
+class _GameRecorder:
+    def __init__(self):
+        self.turns = []
+        self._rolls = None
+
+    def observe(self, engine, move):
+        # A new roll starts a new turn; later moves of the turn extend its play
+        if engine.rolls != self._rolls:
+            self._rolls = engine.rolls
+            values = engine.dice.values
+            self.turns.append((engine.board.cells.tobytes(), engine.turn.value, values[0], values[1], []))
+        self.turns[-1][4].append(move.id)
+
+    def records(self, engine, game):
+        records = np.zeros(len(self.turns), dtype=RECORD)
+        boards = b"".join(turn[0] for turn in self.turns)
+        records["board"] = np.frombuffer(boards, dtype=np.int8).reshape(-1, NUM_SLOTS)
+        records["turn"] = [turn[1] for turn in self.turns]
+        records["dice"] = [turn[2:4] for turn in self.turns]
+        records["play"] = [turn[4] + [-1] * (4 - len(turn[4])) for turn in self.turns]
+        records["outcome"] = engine.game_value()
+        records["game"] = game
+        return records
+
+# Plays games numbered first_game to first_game + games - 1 of bot1 (white) against bot2 (black) and
+# streams their records into sink (anything with write(records)). Up to queue_size finished games
+# wait for the writer thread; beyond that play pauses until it catches up. With a seed the games are
+# the ones BackgammonArbiter.simulate plays with that seed. The sink is left open. Returns the results
+def generate(bot1: BackgammonBot, bot2: BackgammonBot, games, sink, seed=None, first_game=0,
+             queue_size=64) -> ArbiterResults:
+    arbiter = BackgammonArbiter(bot1=bot1, bot2=bot2)
+    results = ArbiterResults()
+    pending = queue.Queue(maxsize=queue_size)
+    errors = []
+    writer = threading.Thread(target=_drain, args=(pending, sink, errors), daemon=True)
+    writer.start()
+
+    try:
+        for game in range(first_game, first_game + games):
+            if errors:
+                break
+            recorder = _GameRecorder()
+            state = None if seed is None else random.getstate()
+            try:
+                engine = None if seed is None else seeded_engine(seed, game)
+                engine = arbiter.simulate_single_game(white_bot=bot1, black_bot=bot2, results=results,
+                                                      engine=engine, observer=recorder.observe)
+            finally:
+                # Seeding the bots must not move the caller's random stream; unseeded games go on drawing from it
+                if state is not None:
+                    random.setstate(state)
+            pending.put(recorder.records(engine, game))
+    finally:
+        pending.put(None)
+        writer.join()
+
+    if errors:
+        raise errors[0]
+    return results
+
+# Writer thread: writes queued batches until the None sentinel. After a failure it keeps taking
+# batches off the queue so the player is never left blocked on a full queue
+def _drain(pending, sink, errors):
+    while True:
+        records = pending.get()
+        if records is None:
+            return
+        if not errors:
+            try:
+                sink.write(records)
+            except Exception as error:
+                errors.append(error)
+
+def _shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, "shard-*.rec")))
+
+# Each shard in directory as a read-only memory map of records; nothing is read until used
+def read_shards(directory):
+    for path in _shard_paths(directory):
+        if os.path.getsize(path) > 0:
+            yield np.memmap(path, dtype=RECORD, mode="r")
+
+# The records of every shard in directory in batches of up to batch_size, each a view into a shard
+def iter_records(directory, batch_size=4096):
+    for shard in read_shards(directory):
+        for first in range(0, len(shard), batch_size):
+            yield shard[first:first + batch_size]
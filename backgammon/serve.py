@@ -0,0 +1,294 @@
+"""
+Local evaluation server.
+
+    python -m backgammon.serve [--bot NAME] [--weights PATH] [--depth D]
+                               [--host HOST] [--port PORT | --unix PATH]
+                               [--window MS] [--max-batch N]
+
+loads one bot once and answers requests over persistent TCP or Unix socket
+connections, one JSON object per line each way. A request names a position
+and the roll to play:
+
+    {"id": 1, "position": "4HPwATDgc/ABMA", "turn": "black", "dice": [3, 1]}
+
+position is a base64 board ID (Board.position_id()) or engine ID
+(BackgammonEngine.position_id(), which carries the turn and dice, so "turn"
+and "dice" may then be left out); base64 padding is optional. The reply
+carries the request's id, the chosen play as [from, to] point indices, the
+engine ID after it, and White's evaluation of that position with the
+opponent to roll:
+
+    {"id": 1, "play": [[8, 5], [6, 5]], "position": "...", "evaluation": 12.5}
+
+or {"id": 1, "error": "..."} for a bad request. Replies on a connection come
+in request order, so clients may pipeline. Requests arriving within --window
+milliseconds of each other, from any connection, are evaluated as one batch;
+the network bot scores every play of every request in a batch in one forward
+pass per side to move.
+"""
+
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+from backgammon.bots import (ExpectiminimaxBot, GPTHeuristicBot, NetworkBot, NetworkEvaluator, RandomBot,
+                             SimpleHeuristicBot)
+from backgammon.engine import ENGINE_ID_SIZE, POSITION_ID_SIZE, BackgammonEngine, Player
+from backgammon.network import Network, equity
+
+BOTS = ("random", "simple", "gpt", "expectiminimax", "network")
+DEFAULT_PORT = 8765
+
+_TURNS = {"white": Player.WHITE, "black": Player.BLACK}
+
+
+# The bot called name and the White-centric evaluator used to score its plays. weights, an .npz file
+# of network weights, gives the network bot its network and the expectiminimax bot its evaluator
+def make_bot(name, weights=None, depth=2):
+    network = None if weights is None else Network.load(weights)
+    if name == "network":
+        bot = NetworkBot(network)
+        return bot, NetworkEvaluator(bot.network)
+
+    evaluator = None if network is None else NetworkEvaluator(network)
+    if name == "expectiminimax":
+        bot = ExpectiminimaxBot(evaluator=evaluator, depth=depth, time_limit=None)
+    elif name in BOTS:
+        bot = {"random": RandomBot, "simple": SimpleHeuristicBot, "gpt": GPTHeuristicBot}[name]()
+    else:
+        raise ValueError(f"Unknown bot {name!r}, expected one of {', '.join(BOTS)}")
+
+    if evaluator is None:
+        evaluator = getattr(bot, "evaluator", None) or GPTHeuristicBot()._board_score_white
+    return bot, evaluator
+
+# Base64 of a position or engine ID, without padding
+def encode_id(position_id: bytes) -> str:
+    return base64.b64encode(position_id).decode("ascii").rstrip("=")
+
+# An engine in the position and roll a request describes, with its legal moves generated, which may
+# be none. Raises ValueError when the request is malformed or the game is already over
+def parse_request(request) -> BackgammonEngine:
+    if not isinstance(request, dict) or not isinstance(request.get("position"), str):
+        raise ValueError("Request must be a JSON object with a base64 \"position\"")
+    text = request["position"]
+    try:
+        position_id = base64.b64decode(text + "=" * (-len(text) % 4), validate=True)
+    except binascii.Error:
+        raise ValueError("Position is not valid base64") from None
+    if len(position_id) == POSITION_ID_SIZE:
+        position_id += bytes(ENGINE_ID_SIZE - POSITION_ID_SIZE)
+    elif len(position_id) != ENGINE_ID_SIZE:
+        raise ValueError(f"Position must be a {POSITION_ID_SIZE}-byte board or {ENGINE_ID_SIZE}-byte engine ID")
+
+    engine = BackgammonEngine()
+    engine.load_position_id(position_id)
+    if "turn" in request:
+        if request["turn"] not in _TURNS:
+            raise ValueError("Turn must be \"white\" or \"black\"")
+        engine.turn = _TURNS[request["turn"]]
+    if "dice" in request:
+        dice = request["dice"]
+        if not isinstance(dice, list) or len(dice) != 2 or any(not isinstance(die, int) or not 1 <= die <= 6 for die in dice):
+            raise ValueError("Dice must be two numbers from 1 to 6")
+        engine.dice.values = [dice[0]] * 4 if dice[0] == dice[1] else list(dice)
+
+    if engine.winner is not None:
+        raise ValueError("The game is already over")
+    if engine.turn is None or len(engine.dice.values) == 0:
+        raise ValueError("Request must give the side to move and the dice")
+    engine.generate_legal_moves()
+    return engine
+
+# The reply fields for moves, already played by player on engine. The turn is passed to the
+# opponent with no dice first, as it is when the moves use up the roll
+def _reply(engine, player, moves, evaluation) -> dict:
+    if engine.turn == player and engine.winner is None:
+        engine.next_turn(roll=False)
+    engine.dice.values.clear()
+    return {"play": [[move.start_index, move.final_index] for move in moves],
+            "position": encode_id(engine.position_id()),
+            "evaluation": evaluation}
+
+# The network's best play for each engine, from one forward pass over every play of every engine
+# with the same player to move. Returns each play and its evaluation
+def _network_plays(network, scale, engines) -> list:
+    plays = [engine.generate_plays() for engine in engines]
+    chosen = [None] * len(engines)
+    for player, opponent in ((Player.WHITE, Player.BLACK), (Player.BLACK, Player.WHITE)):
+        group = [index for index, engine in enumerate(engines) if engine.turn == player]
+        if len(group) == 0:
+            continue
+        positions = np.frombuffer(b"".join(play.position for index in group for play in plays[index]), dtype=np.int8)
+        equities = equity(network.evaluate(positions, opponent))
+
+        start = 0
+        for index in group:
+            values = equities[start:start + len(plays[index])]
+            start += len(plays[index])
+            best = int(np.argmax(values) if player == Player.WHITE else np.argmin(values))
+            chosen[index] = (plays[index][best], scale * float(values[best]))
+    return chosen
+
+# The reply fields for each engine from parse_request(), playing the engines' turns with bot and
+# scoring the results with evaluator. The network bot's plays are chosen by _network_plays()
+def evaluate_engines(bot, evaluator, engines) -> list:
+    replies = []
+    if isinstance(bot, NetworkBot):
+        chosen = _network_plays(bot.network, evaluator.scale, engines)
+        for engine, (play, evaluation) in zip(engines, chosen):
+            player = engine.turn
+            for move in play.moves:
+                engine.apply(move)
+            replies.append(_reply(engine, player, play.moves, evaluation))
+        return replies
+
+    for engine in engines:
+        player = engine.turn
+        moves = []
+        while engine.turn == player and engine.winner is None and engine.has_legal_move():
+            move = bot.calculate_move(engine)
+            engine.apply(move)
+            moves.append(move)
+        reply = _reply(engine, player, moves, None)
+        reply["evaluation"] = float(evaluator(engine))
+        replies.append(reply)
+    return replies
+
+
+class EvaluationServer:
+    """
+    Answers JSON-lines requests with `bot`'s play and `evaluator`'s score
+    (see the module docstring):
+    - Requests are queued from every connection; the first one waits
+      `window` seconds for others to join it, up to `max_batch` in all
+    - Each batch is evaluated by evaluate() on one worker thread, so the
+      bot is only ever used by one thread and the event loop keeps
+      accepting requests meanwhile.
+    """
+
+    def __init__(self, bot, evaluator, window=0.002, max_batch=256):
+        self.bot = bot
+        self.evaluator = evaluator
+        self.window = window
+        self.max_batch = max_batch
+        self.requests = 0
+        self.batches = 0
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    # The reply fields for each engine from parse_request(), see evaluate_engines()
+    def evaluate(self, engines) -> list:
+        return evaluate_engines(self.bot, self.evaluator, engines)
+
+    # Serves on host and port, or on the Unix socket unix, until cancelled.
+    # ready, when given, is called with the asyncio server once it is listening
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, unix=None, ready=None):
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batches())
+        if unix is not None:
+            server = await asyncio.start_unix_server(self._handle, path=unix)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+    # One connection: requests are read and queued as they come, and a sender task writes each reply
+    # once it and every earlier one on the connection are done. A line over the stream's limit stops
+    # the reading, but the lines before it are still answered. Dropped connections and shutdown
+    # just close the connection: asyncio would otherwise report them as unhandled errors
+    async def _handle(self, reader, writer):
+        replies = asyncio.Queue()
+        sender = asyncio.create_task(self._send(replies, writer))
+        try:
+            try:
+                while line := await reader.readline():
+                    if line.strip():
+                        replies.put_nowait(self._submit(line))
+            except ValueError:
+                pass
+            replies.put_nowait(None)
+            await sender
+        except (ConnectionError, asyncio.CancelledError):
+            sender.cancel()
+        finally:
+            writer.close()
+
+    async def _send(self, replies, writer):
+        while (future := await replies.get()) is not None:
+            writer.write(json.dumps(await future).encode() + b"\n")
+            await writer.drain()
+
+    # Future of the reply to one request line, already set when the request can't be parsed, whatever
+    # the reason, so one bad request never closes the connection and loses the replies before it
+    def _submit(self, line) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        request = None
+        try:
+            request = json.loads(line)
+            engine = parse_request(request)
+        except Exception as error:
+            request_id = request.get("id") if isinstance(request, dict) else None
+            future.set_result({"id": request_id, "error": str(error)})
+        else:
+            self._queue.put_nowait((request.get("id"), engine, future))
+        return future
+
+    async def _batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                replies = await loop.run_in_executor(self._executor, self.evaluate, [engine for _, engine, _ in batch])
+            except Exception as error:
+                replies = [{"error": f"Evaluation failed: {error}"}] * len(batch)
+            self.requests += len(batch)
+            self.batches += 1
+            for (request_id, _, future), reply in zip(batch, replies):
+                if not future.cancelled():
+                    future.set_result({"id": request_id, **reply})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve bot evaluations over a local socket.")
+    parser.add_argument("--bot", choices=BOTS, default="gpt", help="bot choosing the plays (default: gpt)")
+    parser.add_argument("--weights", help="network weights (.npz) for the network bot or expectiminimax evaluator")
+    parser.add_argument("--depth", type=int, default=2, help="expectiminimax search depth (default: 2)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--window", type=float, default=2.0,
+                        help="milliseconds a request waits for others to batch with (default: 2)")
+    parser.add_argument("--max-batch", type=int, default=256, help="most requests per batch (default: 256)")
+    args = parser.parse_args()
+
+    bot, evaluator = make_bot(args.bot, weights=args.weights, depth=args.depth)
+    server = EvaluationServer(bot, evaluator, window=args.window / 1000, max_batch=args.max_batch)
+    where = args.unix if args.unix is not None else f"{args.host}:{args.port}"
+    print(f"Serving {bot.name} on {where}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        print(f"Answered {server.requests} requests in {server.batches} batches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Round-robin tournaments with sequential early stopping.
+
+Every pair of bots plays seeded duplicate games (each deal twice, colours
+swapped) in batches. After each batch a sequential probability ratio test
+decides whether one bot of the pair is stronger; the pairing stops as soon
+as it does, or after `max_games`. The test weighs H0: the first bot wins
+with probability 0.5 - delta against H1: 0.5 + delta, with error rates
+alpha and beta, so a pairing stops once its log-likelihood ratio leaves
+(log(beta / (1 - alpha)), log((1 - beta) / alpha)).
+
+Batches are spread over a process pool. Each pairing's batches are judged in
+order, so the results are the same whatever the number of workers.
+"""
+
+import math
+import random
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from backgammon.arbiter import ArbiterResults, BackgammonArbiter
+from backgammon.bots import BackgammonBot
+
+
+# Result of one pairing; decision is 1 or 2 for the stronger bot, None while undecided
+class PairingResult:
+    def __init__(self, bot1: int, bot2: int):
+        self.bot1 = bot1
+        self.bot2 = bot2
+        self.bot1_wins = 0
+        self.bot2_wins = 0
+        self.llr = 0.0
+        self.decision = None
+
+    @property
+    def games(self) -> int:
+        return self.bot1_wins + self.bot2_wins
+
+    # Elo difference of bot1 over bot2 implied by the score so far, clamped for one-sided scores
+    @property
+    def elo(self) -> float:
+        if self.games == 0:
+            return 0.0
+        score = min(max(self.bot1_wins / self.games, 1e-3), 1 - 1e-3)
+        return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+class TournamentResults:
+    def __init__(self, names):
+        self.names = names
+        self.pairings = []
+
+    # One row per bot, best first: (name, pairings won, lost, undecided, games, wins).
+    # Bots are ranked by pairings won, then by share of games won
+    def ranking(self) -> list:
+        rows = {index: [name, 0, 0, 0, 0, 0] for index, name in enumerate(self.names)}
+        for pairing in self.pairings:
+            for index, wins, other_wins, won in ((pairing.bot1, pairing.bot1_wins, pairing.bot2_wins, 1),
+                                                 (pairing.bot2, pairing.bot2_wins, pairing.bot1_wins, 2)):
+                row = rows[index]
+                if pairing.decision is None:
+                    row[3] += 1
+                elif pairing.decision == won:
+                    row[1] += 1
+                else:
+                    row[2] += 1
+                row[4] += wins + other_wins
+                row[5] += wins
+
+        return sorted((tuple(row) for row in rows.values()),
+                      key=lambda row: (row[1], row[5] / row[4] if row[4] else 0.0), reverse=True)
+
+    # One line on a pairing's score and outcome
+    def describe(self, pairing: PairingResult) -> str:
+        first, second = self.names[pairing.bot1], self.names[pairing.bot2]
+        return f"{first} v {second}: {pairing.bot1_wins}-{pairing.bot2_wins}, {self._outcome(pairing)}"
+
+    def _outcome(self, pairing: PairingResult) -> str:
+        if pairing.decision is None:
+            return "undecided"
+        return f"{self.names[(pairing.bot1, pairing.bot2)[pairing.decision - 1]]} stronger"
+
+    # The ranking and every pairing as printable text
+    def format_table(self) -> str:
+        width = max(len(name) for name in self.names) + 2
+        lines = [f"{'#':>2}  {'bot':<{width}}{'won':>5}{'lost':>6}{'open':>6}{'games':>8}{'win %':>8}"]
+        for rank, (name, won, lost, undecided, games, wins) in enumerate(self.ranking(), 1):
+            share = 100.0 * wins / games if games else 0.0
+            lines.append(f"{rank:>2}  {name:<{width}}{won:>5}{lost:>6}{undecided:>6}{games:>8}{share:>8.1f}")
+
+        lines.append("")
+        lines.append(f"{'pairing':<{2 * width + 4}}{'score':>12}{'elo':>8}{'llr':>8}  result")
+        for pairing in self.pairings:
+            first, second = self.names[pairing.bot1], self.names[pairing.bot2]
+            score = f"{pairing.bot1_wins}-{pairing.bot2_wins}"
+            lines.append(f"{first + ' v ' + second:<{2 * width + 4}}{score:>12}{pairing.elo:>+8.0f}"
+                         f"{pairing.llr:>8.2f}  {self._outcome(pairing)}")
+        return "\n".join(lines)
+
+
+class Tournament:
+    def __init__(self, bots: list, batch_size=50, max_games=2000, delta=0.05, alpha=0.05, beta=0.05):
+        if len(bots) < 2:
+            raise ValueError("A tournament needs at least two bots")
+
+        self.bots = bots
+        # Deals per batch; every deal is played twice, so a batch is 2 * batch_size games
+        self.batch_size = batch_size
+        self.max_games = max_games
+
+        # Per game log-likelihood ratio of a win and a loss for the first bot of a pairing
+        self._win_llr = math.log((0.5 + delta) / (0.5 - delta))
+        self._loss_llr = -self._win_llr
+        self._lower = math.log(beta / (1.0 - alpha))
+        self._upper = math.log((1.0 - beta) / alpha)
+
+    # Plays every pairing until its test decides or max_games is reached.
+    # Each pairing gets its own seeded games; seed=None draws a seed for the run
+    def run(self, workers=1, seed=None, print_progress=False) -> TournamentResults:
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+
+        results = TournamentResults(self._names())
+        results.pairings = [PairingResult(first, second) for first in range(len(self.bots))
+                            for second in range(first + 1, len(self.bots))]
+        started = dict.fromkeys(results.pairings, 0)
+        active = list(results.pairings)
+
+        # (first deal, deals) of a pairing's next batch, or None once max_games is reached
+        def next_batch(pairing):
+            first = started[pairing]
+            count = min(self.batch_size, (self.max_games - 2 * first) // 2)
+            if count <= 0:
+                return None
+            started[pairing] = first + count
+            return first, count
+
+        def finish(pairing):
+            active.remove(pairing)
+            if print_progress:
+                print(results.describe(pairing), flush=True)
+
+        if workers <= 1:
+            while active:
+                for pairing in list(active):
+                    batch = next_batch(pairing)
+                    if batch is not None:
+                        self._record(pairing, _play_batch(self.bots[pairing.bot1], self.bots[pairing.bot2],
+                                                          *batch, _pairing_seed(seed, pairing)))
+                    if batch is None or pairing.decision is not None:
+                        finish(pairing)
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep the pool busy by running ahead on undecided pairings. A pairing's batches are still
+            # judged strictly in order, and those queued past its decision are dropped
+            queued = {pairing: deque() for pairing in results.pairings}
+
+            def fill():
+                ahead = math.ceil(workers / len(active)) if active else 0
+                for pairing in list(active):
+                    line = queued[pairing]
+                    while len(line) < ahead:
+                        batch = next_batch(pairing)
+                        if batch is None:
+                            break
+                        line.append(executor.submit(_play_batch, self.bots[pairing.bot1], self.bots[pairing.bot2],
+                                                    *batch, _pairing_seed(seed, pairing)))
+                    if not line:
+                        finish(pairing)
+
+            fill()
+            while active:
+                wait([future for pairing in active for future in queued[pairing]], return_when=FIRST_COMPLETED)
+                for pairing in list(active):
+                    line = queued[pairing]
+                    while line and line[0].done():
+                        self._record(pairing, line.popleft().result())
+                        if pairing.decision is not None:
+                            for future in line:
+                                future.cancel()
+                            line.clear()
+                            finish(pairing)
+                            break
+                fill()
+        return results
+
+    # Adds a batch's games to pairing and runs the test on the new totals
+    def _record(self, pairing: PairingResult, batch: ArbiterResults):
+        pairing.bot1_wins += batch.bot1_wins
+        pairing.bot2_wins += batch.bot2_wins
+        pairing.llr = pairing.bot1_wins * self._win_llr + pairing.bot2_wins * self._loss_llr
+        if pairing.llr >= self._upper:
+            pairing.decision = 1
+        elif pairing.llr <= self._lower:
+            pairing.decision = 2
+
+    # Bot names, numbered where several bots share one
+    def _names(self) -> list:
+        names = [bot.name or type(bot).__name__ for bot in self.bots]
+        return [f"{name}#{names[:index].count(name) + 1}" if names.count(name) > 1 else name
+                for index, name in enumerate(names)]
+
+def _pairing_seed(seed, pairing: PairingResult) -> str:
+    return f"{seed}:{pairing.bot1}-{pairing.bot2}"
+
+# Process pool entry point: deals first to first + count - 1 of a pairing, both colour orders
+def _play_batch(bot1: BackgammonBot, bot2: BackgammonBot, first, count, seed) -> ArbiterResults:
+    arbiter = BackgammonArbiter(bot1=bot1, bot2=bot2)
+    return arbiter.simulate_games(first_game=first, count=count, seed=seed, results=ArbiterResults(),
+                                  duplicate=True)
@@ -0,0 +1,71 @@
+import random
+from array import array
+
+import pytest
+
+from backgammon.bearoff import side_counts
+from backgammon.bearoff.build import build
+from backgammon.bots import BearoffEvaluator, ExpectiminimaxBot, GPTHeuristicBot
+from backgammon.engine import BLACK_HOME, WHITE_HOME, BackgammonEngine, Player
+
+
+@pytest.fixture(scope="module")
+def database_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("bearoff") / "bearoff.bin"
+    build(str(path))
+    return str(path)
+
+def _engine(cells, turn, dice=()):
+    engine = BackgammonEngine()
+    engine.board.load(array("b", cells).tobytes())
+    engine.turn = turn
+    engine.dice.values = list(dice)
+    engine.generate_legal_moves()
+    return engine
+
+# White all home with 3 off; Black home but for one stone on `last`
+def _bear_in(last):
+    cells = [0] * 28
+    for slot in range(19, 25):
+        cells[slot] = 2
+    cells[WHITE_HOME] = 3
+    for slot, count in ((1, 3), (2, 3), (3, 2), (4, 2), (5, 2), (6, 2)):
+        cells[slot] = -count
+    cells[last] -= 1
+    return cells
+
+
+def test_last_stone_coming_home_is_continuous(database_path):
+    evaluator = BearoffEvaluator(path=database_path)
+    outside = evaluator(_engine(_bear_in(7), Player.WHITE))
+    home = evaluator(_engine(_bear_in(6), Player.WHITE))
+    assert abs(outside - home) < 50
+
+def test_search_brings_the_last_stone_home(database_path):
+    bot = ExpectiminimaxBot(evaluator=BearoffEvaluator(path=database_path), depth=1, time_limit=None)
+    engine = _engine(_bear_in(7), Player.BLACK, (2, 1))
+    moves = []
+    while engine.turn == Player.BLACK:
+        move = bot.calculate_move(engine)
+        engine.apply(move)
+        moves.append((move.start_index, move.final_index))
+    assert (7, 5) in moves
+
+def test_races_have_no_jumps(database_path):
+    evaluator = BearoffEvaluator(path=database_path)
+    bot = GPTHeuristicBot()
+    random.seed(0)
+    for _ in range(100):
+        engine = BackgammonEngine()
+        engine.start()
+        while engine.winner is None:
+            move = bot.calculate_move(engine)
+            board = engine.board
+            if board.rear_black < board.rear_white and side_counts(board.cells, engine.turn) is None:
+                # A single move of a side still coming in changes its chances by a few percent at most
+                before = evaluator(engine)
+                engine.apply(move)
+                if engine.turn == move.player:
+                    assert abs(evaluator(engine) - before) < 100
+                engine.undo()
+            engine.make_move(move)
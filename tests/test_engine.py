@@ -0,0 +1,193 @@
+import random
+from array import array
+
+import pytest
+
+from backgammon.engine import (BLACK_BAR, BLACK_HOME, ENGINE_ID_SIZE, POSITION_ID_SIZE, WHITE_BAR, WHITE_HOME,
+                               BackgammonEngine, Board, Features)
+
+
+# Engines at the start of every turn of `games` games of random play, each copied so it can be changed
+def _positions(games, seed=0):
+    rng = random.Random(seed)
+    for _ in range(games):
+        engine = BackgammonEngine(rng=random.Random(rng.getrandbits(32)))
+        engine.start()
+        while engine.winner is None:
+            yield _engine(engine.board.cells, engine.turn, engine.dice.values)
+            turn = engine.turn
+            while engine.turn == turn and engine.winner is None:
+                engine.make_move(rng.choice(engine.legal_moves))
+
+def _engine(cells, turn, dice):
+    engine = BackgammonEngine()
+    engine.board.load(cells)
+    engine.turn = turn
+    engine.dice.values = list(dice)
+    engine.generate_legal_moves()
+    return engine
+
+def _features(features: Features) -> tuple:
+    return tuple(getattr(features, name) for name in Features.__slots__)
+
+# Everything apply() may change and undo() has to put back
+def _state(engine) -> tuple:
+    board = engine.board
+    return (board.cells.tobytes(), board.zobrist, _features(board.white), _features(board.black),
+            board.rear_white, board.rear_black, list(engine.dice.values), engine.turn, engine.winner,
+            list(engine.legal_moves), engine.position_hash)
+
+# The board state worked out from scratch for cells
+def _recomputed(cells) -> tuple:
+    board = Board()
+    board.load(cells)
+    return (board.zobrist, _features(board.white), _features(board.black), board.rear_white, board.rear_black)
+
+
+def test_apply_and_undo_restore_the_exact_state():
+    rng = random.Random(1)
+    for engine in _positions(20):
+        before = _state(engine)
+        turn = engine.turn
+        applied = 0
+        while engine.turn == turn and engine.winner is None and engine.legal_moves:
+            engine.apply(rng.choice(engine.legal_moves))
+            applied += 1
+        for _ in range(applied):
+            engine.undo()
+        assert _state(engine) == before
+
+def test_incremental_state_matches_a_full_recompute():
+    rng = random.Random(2)
+    for engine in _positions(20):
+        turn = engine.turn
+        while engine.turn == turn and engine.winner is None and engine.legal_moves:
+            engine.apply(rng.choice(engine.legal_moves))
+            board = engine.board
+            assert (board.zobrist, _features(board.white), _features(board.black),
+                    board.rear_white, board.rear_black) == _recomputed(board.cells)
+            if engine.turn == turn:
+                fresh = _engine(board.cells, engine.turn, engine.dice.values)
+                assert engine.legal_moves == fresh.legal_moves
+
+
+# The single die moves of the player with sign on cells, as (start, final) slots, from the rules alone
+def _reference_moves(cells, sign, die):
+    bar, home = (WHITE_BAR, WHITE_HOME) if sign > 0 else (BLACK_BAR, BLACK_HOME)
+    if cells[bar] * sign > 0:
+        starts = [bar]
+    else:
+        starts = [slot for slot in range(1, 25) if cells[slot] * sign > 0]
+    home_board = range(19, 25) if sign > 0 else range(1, 7)
+    all_home = cells[bar] * sign <= 0 and all(cells[slot] * sign <= 0 for slot in range(1, 25)
+                                              if slot not in home_board)
+    for start in starts:
+        final = start + die * sign
+        if 1 <= final <= 24:
+            if cells[final] * sign >= -1:
+                yield start, final
+        elif all_home:
+            # Bearing off: with the exact die, or a larger one from the rearmost stone
+            behind = range(19, start) if sign > 0 else range(start + 1, 7)
+            if final == (25 if sign > 0 else 0) or not any(cells[slot] * sign > 0 for slot in behind):
+                yield start, home
+
+def _reference_move(cells, sign, start, final):
+    cells = list(cells)
+    cells[start] -= sign
+    if cells[final] == -sign:
+        cells[final] = 0
+        cells[BLACK_BAR if sign > 0 else WHITE_BAR] -= sign
+    cells[final] += sign
+    return cells
+
+# Every position a whole turn can reach with dice, searching every order of the dice, keeping the
+# plays that use the most dice and, when only one of two dice can be used, the larger one if possible
+def _reference_positions(cells, sign, dice) -> set:
+    home = WHITE_HOME if sign > 0 else BLACK_HOME
+    reached = {}
+
+    def search(cells, left, used):
+        if cells[home] * sign == 15:
+            reached.setdefault(bytes(array("b", cells)), set()).add(tuple(dice))
+            return
+        moved = False
+        for die in set(left):
+            rest = list(left)
+            rest.remove(die)
+            for start, final in _reference_moves(cells, sign, die):
+                moved = True
+                search(_reference_move(cells, sign, start, final), rest, used + (die,))
+        if not moved:
+            reached.setdefault(bytes(array("b", cells)), set()).add(used)
+
+    search(list(cells), list(dice), ())
+    most = max(len(used) for uses in reached.values() for used in uses)
+    positions = {key for key, uses in reached.items() if any(len(used) == most for used in uses)}
+    if most == 1 and len(dice) == 2 and dice[0] != dice[1]:
+        larger = {key for key in positions if (max(dice),) in reached[key]}
+        if larger:
+            positions = larger
+    return positions
+
+def test_generate_plays_matches_a_brute_force_search():
+    for engine in _positions(15, seed=3):
+        cells = engine.board.cells
+        dice = engine.dice.values
+        plays = engine.generate_plays()
+        assert {play.position for play in plays} == _reference_positions(cells, engine.turn.value, dice)
+        assert len({play.position for play in plays}) == len(plays)
+        for play in plays:
+            replay = _engine(cells, engine.turn, dice)
+            for move in play.moves:
+                replay.apply(move)
+            assert replay.board.cells.tobytes() == play.position
+
+
+def test_position_ids_round_trip():
+    for engine in _positions(10, seed=4):
+        board = Board()
+        board.load_position_id(engine.board.position_id())
+        assert board.cells == engine.board.cells
+
+        position_id = engine.position_id()
+        loaded = BackgammonEngine()
+        loaded.load_position_id(position_id)
+        assert loaded.position_id() == position_id
+        assert _state(loaded) == _state(engine)
+
+# Board IDs are runs of 1 bits, one run per slot: White's from slot 24 down, then Black's from slot 1 up
+@pytest.mark.parametrize("position_id", [
+    bytes(POSITION_ID_SIZE - 1),
+    bytes(POSITION_ID_SIZE + 1),
+    ((1 << 16) - 1).to_bytes(POSITION_ID_SIZE, "little"),        # 16 White stones on slot 24
+    (1 | 1 << 26 + 23).to_bytes(POSITION_ID_SIZE, "little"),     # White and Black both on slot 24
+])
+def test_malformed_position_ids_are_rejected(position_id):
+    with pytest.raises(ValueError):
+        Board().load_position_id(position_id)
+
+@pytest.mark.parametrize("state, dice", [
+    (0x13, 0x31),            # no side to move is 0, White 1, Black 2: 3 is none of them
+    (0x51, 0x33),            # five dice
+    (0x01, 0x31),            # no dice left but die values
+    (0x11, 0x30),            # one die left in the second nibble
+    (0x11, 0x07),            # a 7
+    (0x21, 0x70),            # a 7 as the second die
+    (0x31, 0x21),            # three dice of a non-double
+    (0x21, 0x02),            # two dice, one of them 0
+])
+def test_malformed_engine_ids_are_rejected(state, dice):
+    engine = BackgammonEngine()
+    engine.start()
+    position_id = engine.board.position_id() + bytes((state, dice))
+    assert len(position_id) == ENGINE_ID_SIZE
+    with pytest.raises(ValueError):
+        BackgammonEngine().load_position_id(position_id)
+
+def test_engine_ids_of_the_wrong_size_are_rejected():
+    engine = BackgammonEngine()
+    engine.start()
+    for position_id in (engine.position_id()[:-1], engine.position_id() + bytes(1)):
+        with pytest.raises(ValueError):
+            BackgammonEngine().load_position_id(position_id)